@@ -0,0 +1,265 @@
+import math
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_size (
+    total INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT INTO cache_size (total, entries)
+    SELECT 0, 0 WHERE NOT EXISTS (SELECT 1 FROM cache_size);
+CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+BEGIN
+    UPDATE cache_size SET total = total + NEW.size, entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+BEGIN
+    UPDATE cache_size SET total = total - OLD.size, entries = entries - 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE cache_size SET total = total - OLD.size + NEW.size;
+END;
+'''
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (WAL), общий для всех процессов на машине.
+
+    В отличие от LocMemCache, запись из одного воркера видна остальным,
+    и инвалидация доходит до всех процессов без отдельного сервера.
+    Размер ограничен опцией MAX_SIZE (в байтах): при переполнении
+    вытесняются давно не читанные ключи (LRU).
+    """
+
+    # Время последнего чтения обновляется не чаще раза в столько секунд,
+    # чтобы чтения не превращались в запись.
+    touch_resolution = 30
+    # Ограничение SQLite на число параметров в одном запросе.
+    max_params = 500
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._cull_to = float(options.get('CULL_TO', 0.9))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # После fork соединение родителя использовать нельзя.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=30, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        # Иначе INSERT OR REPLACE не вызывает триггер удаления,
+        # и учёт общего размера кэша разъезжается.
+        connection.execute('PRAGMA recursive_triggers=ON')
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _expiry(self, timeout):
+        # get_backend_timeout уже возвращает абсолютное время истечения.
+        return self.get_backend_timeout(timeout)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _write(self, rows):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            self._cull(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _row(self, key, value, timeout):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return key, blob, self._expiry(timeout), time.time(), len(blob)
+
+    def _size(self, db):
+        return db.execute('SELECT total, entries FROM cache_size').fetchone()
+
+    def _cull(self, db):
+        total, _ = self._size(db)
+        if total <= self._max_size:
+            return
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?',
+            (time.time(),),
+        )
+        target = self._max_size * self._cull_to
+        while True:
+            total, entries = self._size(db)
+            if total <= target or not entries:
+                return
+            # Удаляем примерно столько старых ключей, сколько нужно,
+            # исходя из среднего размера записи.
+            batch = math.ceil((total - target) * entries / total)
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (batch,),
+            )
+
+    def _select(self, keys):
+        for start in range(0, len(keys), self.max_params):
+            chunk = keys[start:start + self.max_params]
+            placeholders = ','.join('?' * len(chunk))
+            yield from self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({placeholders})',
+                chunk,
+            )
+
+    def _fetch(self, keys):
+        now = time.time()
+        found = {}
+        expired = []
+        stale = []
+        for key, blob, expires, accessed in self._select(keys):
+            if expires is not None and expires <= now:
+                expired.append((key,))
+                continue
+            found[key] = pickle.loads(blob)
+            if now - accessed > self.touch_resolution:
+                stale.append((now, key))
+        if expired:
+            self._db.executemany('DELETE FROM cache WHERE key = ?', expired)
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([self._row(self._key(key, version), value, timeout)])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([
+            self._row(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ])
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        key, blob, expires, accessed, size = self._row(key, value, timeout)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? '
+                'AND expires IS NOT NULL AND expires <= ?',
+                (key, time.time()),
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, blob, expires, accessed, size),
+            ).rowcount == 1
+            self._cull(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key),
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?',
+            (self._expiry(timeout), key),
+        ).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._fetch([key])
+
+    def delete(self, key, version=None):
+        self._db.execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь процесс: открывать файл на каждый
+        # запрос дороже, чем держать его.
+        pass
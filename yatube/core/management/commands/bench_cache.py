@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache.sqlite import SQLiteCache
+
+
+def make_backend(name, path):
+    if name == 'locmem':
+        return LocMemCache('bench', {'TIMEOUT': None})
+    return SQLiteCache(path, {'TIMEOUT': None})
+
+
+def worker(name, path, operations, keys, seed, results):
+    """Смесь чтений, пакетных чтений и записей, как у страниц ленты."""
+    cache = make_backend(name, path)
+    rng = random.Random(seed)
+    hits = misses = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        roll = rng.random()
+        key = f'key:{rng.randrange(keys)}'
+        if roll < 0.7:
+            if cache.get(key) is None:
+                misses += 1
+                cache.set(key, 'x' * 512)
+            else:
+                hits += 1
+        elif roll < 0.9:
+            batch = [f'key:{rng.randrange(keys)}' for _ in range(10)]
+            found = cache.get_many(batch)
+            hits += len(found)
+            misses += len(batch) - len(found)
+        else:
+            cache.add('counter', 0)
+            cache.incr('counter')
+    results.put((time.perf_counter() - started, hits, misses))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает LocMemCache и SQLiteCache при работе '
+            'нескольких процессов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench-cache.sqlite3')
+            for name in ('locmem', 'sqlite'):
+                self.run(name, path, options)
+
+    def run(self, name, path, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker, args=(
+                name, path, options['operations'], options['keys'],
+                seed, results,
+            ))
+            for seed in range(options['processes'])
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        wall = time.perf_counter() - started
+        hits = sum(hit for _, hit, _ in stats)
+        misses = sum(miss for _, _, miss in stats)
+        total = options['operations'] * options['processes']
+        self.stdout.write(
+            f'{name:>7}: {total / wall:10.0f} оп/с, '
+            f'попаданий {hits / max(hits + misses, 1):.1%}, '
+            f'время {wall:.2f} с'
+        )
@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods
+from django.views.static import was_modified_since
+
+# Имена из хэша (картинки постов и миниатюры sorl) никогда не меняют
+# содержимое, их можно кэшировать навсегда.
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{32,64}\.[a-z0-9]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SHORT = 'public, max-age=3600'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Служебные файлы хранилища: блокировка .blobs.lock и недописанные
+# загрузки *.part.
+PRIVATE_NAME = re.compile(r'(^|/)\.|\.part$')
+
+
+class RangeFile:
+    """Файл, из которого можно прочитать только length байт.
+
+    fileno() оставлен, чтобы gunicorn отдал кусок через sendfile:
+    он начинает с текущей позиции и шлёт Content-Length байт.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(начало, конец) из Range; None - отдать весь файл, ValueError - 416.
+
+    Несколько диапазонов сразу не поддерживаем и отдаём файл целиком,
+    это разрешено RFC 7233.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if not length:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def _accel_response(name, full_path, content_type):
+    # Тело, длину и Range берёт на себя прокси.
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_ACCEL == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + quote(name)
+        )
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def _file_response(request, full_path, size, etag, content_type):
+    response_range = None
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or if_range == etag):
+        try:
+            response_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    file = open(full_path, 'rb')
+    if response_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = size
+        return response
+    start, end = response_range
+    length = end - start + 1
+    response = FileResponse(
+        RangeFile(file, start, length), status=206, content_type=content_type
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT, в том числе миниатюры.
+
+    Если MEDIA_ACCEL настроен, сам файл отдаёт прокси (X-Accel-Redirect
+    у nginx, X-Sendfile у Apache и lighttpd), а Django только проверяет
+    путь и условные заголовки. Иначе работает FileResponse: сервер
+    приложений отдаёт его через wsgi.file_wrapper, gunicorn - sendfile.
+    """
+    if PRIVATE_NAME.search(path):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        not_modified = etag in (tag.strip() for tag in
+                                if_none_match.split(','))
+    else:
+        not_modified = not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime
+        )
+    content_type = (
+        mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    )
+    if not_modified:
+        response = HttpResponseNotModified()
+    elif settings.MEDIA_ACCEL:
+        response = _accel_response(path, full_path, content_type)
+    else:
+        response = _file_response(
+            request, full_path, stat.st_size, etag, content_type
+        )
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = (
+        IMMUTABLE if HASHED_NAME.search(path) else SHORT
+    )
+    return response
@@ -0,0 +1,330 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Каждый воркер копит приращения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сливает их одной транзакцией в файл
+SQLite METRICS_DB, общий для всех процессов, - так /metrics видит сумму
+по всем воркерам, а не по одному случайному. Приращения умершего воркера
+теряются не больше чем за один интервал.
+"""
+import atexit
+import hmac
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from . import profiling
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+# Имя: (тип, справка, границы корзин гистограммы).
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по имени URL, методу и статусу', None,
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL', LATENCY_BUCKETS,
+    ),
+    'yatube_request_queries': (
+        'histogram', 'Запросов к базе на ответ по имени URL', QUERY_BUCKETS,
+    ),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кэш по алиасу', None,
+    ),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кэша по алиасу', None,
+    ),
+    'yatube_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кэш по алиасу', None,
+    ),
+    'yatube_thumbnail_jobs_submitted_total': (
+        'counter', 'Картинки, отданные в пул нарезки миниатюр', None,
+    ),
+    'yatube_thumbnail_jobs_finished_total': (
+        'counter', 'Картинки, которые пул нарезки уже обработал', None,
+    ),
+    'yatube_thumbnail_queue_depth': (
+        'gauge', 'Картинки в очереди на нарезку миниатюр', None,
+    ),
+    'yatube_feed_build_seconds': (
+        'histogram', 'Время раскладки постов по лентам', LATENCY_BUCKETS,
+    ),
+}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, le)
+) WITHOUT ROWID;
+'''
+UPSERT = (
+    'INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (name, labels, le) DO UPDATE '
+    'SET value = value + excluded.value'
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_pending = Counter()
+_lock = threading.Lock()
+_flushed_at = 0.0
+_local = threading.local()
+_aliases = weakref.WeakKeyDictionary()
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _number(value):
+    # format 'g' округлил бы большие счётчики до шести знаков.
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def format_labels(labels):
+    return ','.join(
+        f'{name}="{_escape(value)}"' for name, value in sorted(labels.items())
+    )
+
+
+def inc(name, value=1, **labels):
+    """Прибавляет value к счётчику; до сброса в файл - только в памяти."""
+    if not settings.METRICS_DB:
+        return
+    with _lock:
+        _pending[name, format_labels(labels), ''] += value
+
+
+def observe(name, value, **labels):
+    """Кладёт значение в гистограмму name с границами из METRICS."""
+    if not settings.METRICS_DB:
+        return
+    buckets = METRICS[name][2]
+    index = bisect_left(buckets, value)
+    le = str(buckets[index]) if index < len(buckets) else '+Inf'
+    key = format_labels(labels)
+    with _lock:
+        # Корзины хранятся без накопления, суммируются при выдаче.
+        _pending[f'{name}_bucket', key, le] += 1
+        _pending[f'{name}_sum', key, ''] += value
+        _pending[f'{name}_count', key, ''] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def _db():
+    # Соединение своё у каждого потока и процесса, как в SQLiteCache.
+    path = settings.METRICS_DB
+    if getattr(_local, 'key', None) != (os.getpid(), path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        _local.connection = connection
+        _local.key = (os.getpid(), path)
+    return _local.connection
+
+
+def flush(force=False):
+    """Сливает накопленное в METRICS_DB, если пора или force."""
+    global _flushed_at
+    now = time.monotonic()
+    if not force and now - _flushed_at < settings.METRICS_FLUSH_INTERVAL:
+        return
+    with _lock:
+        rows = [(*key, value) for key, value in _pending.items()]
+        _pending.clear()
+        _flushed_at = now
+    if not rows or not settings.METRICS_DB:
+        return
+    db = _db()
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        db.executemany(UPSERT, rows)
+        db.execute('COMMIT')
+    except sqlite3.Error:
+        if db.in_transaction:
+            db.execute('ROLLBACK')
+        # Файл занят дольше таймаута: попробуем со следующим сбросом.
+        with _lock:
+            for name, labels, le, value in rows:
+                _pending[name, labels, le] += value
+
+
+def _forget_parent():
+    # Буфер родителя сольёт сам родитель; в ребёнке он посчитался бы дважды.
+    global _lock
+    _lock = threading.Lock()
+    _pending.clear()
+
+
+atexit.register(flush, force=True)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_parent)
+
+
+def cache_alias(cache):
+    alias = _aliases.get(cache)
+    if alias is None:
+        alias = next(
+            (alias for alias in settings.CACHES if caches[alias] is cache),
+            'other',
+        )
+        _aliases[cache] = alias
+    return alias
+
+
+def count_cache(cache, hits, misses):
+    alias = cache_alias(cache)
+    if hits:
+        inc('yatube_cache_hits_total', hits, alias=alias)
+    if misses:
+        inc('yatube_cache_misses_total', misses, alias=alias)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа и число SQL по имени URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = bool(settings.METRICS_DB)
+        if self.enabled and count_cache not in profiling.cache_listeners:
+            profiling.cache_listeners.append(count_cache)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        queries = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        inc('yatube_requests_total', view=view, method=request.method,
+            status=response.status_code)
+        observe('yatube_request_duration_seconds', elapsed, view=view)
+        observe('yatube_request_queries', queries.count, view=view)
+        flush()
+        return response
+
+
+def _histogram(name, buckets, rows):
+    """Строки гистограммы: корзины с накоплением, затем sum и count."""
+    bounds = [str(bound) for bound in buckets] + ['+Inf']
+    per_labels = {}
+    for labels, le, value in rows.get(f'{name}_bucket', []):
+        per_labels.setdefault(labels, Counter())[le] += value
+    lines = []
+    for labels in sorted(per_labels):
+        total = 0
+        for le in bounds:
+            total += per_labels[labels][le]
+            bucket_labels = ','.join(filter(None, [labels, f'le="{le}"']))
+            lines.append(
+                f'{name}_bucket{{{bucket_labels}}} {_number(total)}'
+            )
+        for suffix in ('_sum', '_count'):
+            for row_labels, _, value in rows.get(name + suffix, []):
+                if row_labels == labels:
+                    lines.append(
+                        f'{name}{suffix}{{{labels}}} {_number(value)}'
+                    )
+    return lines
+
+
+def _derived(rows):
+    """Значения датчиков, которые считаются из счётчиков при выдаче."""
+    hits = {labels: value
+            for labels, _, value in rows.get('yatube_cache_hits_total', [])}
+    misses = {labels: value for labels, _, value
+              in rows.get('yatube_cache_misses_total', [])}
+    ratio = [
+        (labels, '', hits.get(labels, 0)
+         / (hits.get(labels, 0) + misses.get(labels, 0)))
+        for labels in sorted(set(hits) | set(misses))
+    ]
+    submitted = sum(value for _, _, value in
+                    rows.get('yatube_thumbnail_jobs_submitted_total', []))
+    finished = sum(value for _, _, value in
+                   rows.get('yatube_thumbnail_jobs_finished_total', []))
+    return {
+        'yatube_cache_hit_ratio': ratio,
+        'yatube_thumbnail_queue_depth': [
+            ('', '', max(submitted - finished, 0)),
+        ],
+    }
+
+
+def render():
+    """Все метрики из METRICS_DB в текстовом формате Prometheus."""
+    rows = {}
+    stored = _db().execute(
+        'SELECT name, labels, le, value FROM metrics ORDER BY name, labels'
+    )
+    for name, labels, le, value in stored:
+        rows.setdefault(name, []).append((labels, le, value))
+    rows.update(_derived(rows))
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            lines.extend(_histogram(name, buckets, rows))
+            continue
+        for labels, _, value in rows.get(name, []):
+            labels = f'{{{labels}}}' if labels else ''
+            lines.append(f'{name}{labels} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """/metrics для Prometheus; только с токеном METRICS_TOKEN.
+
+    За nginx REMOTE_ADDR у всех запросов 127.0.0.1, поэтому доступ
+    проверяется по заголовку Authorization: Bearer <токен>.
+    """
+    token = settings.METRICS_TOKEN
+    sent = request.META.get('HTTP_AUTHORIZATION', '')
+    if (not settings.METRICS_DB or not token
+            or not hmac.compare_digest(sent.encode(),
+                                       f'Bearer {token}'.encode())):
+        raise Http404
+    flush(force=True)
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,258 @@
+"""Профилирование выборки запросов: SQL, шаблоны, кэш и миниатюры.
+
+ProfilingMiddleware решает по имени URL, профилировать ли запрос, и
+отдаёт итог заголовком Server-Timing и строкой JSON в логгер
+core.profiling. Шаблоны, кэш и миниатюры обёрнуты один раз при старте
+(install); вне профилируемого запроса обёртка стоит одного чтения
+ContextVar. Время пересекается: SQL из шаблона входит и в tpl.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('profile', default=None)
+_in_cache = ContextVar('in_cache', default=False)
+# Кому ещё, кроме профиля, сообщать о чтениях кэша: (кэш, hits, misses).
+cache_listeners = []
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.thumbnail_count = 0
+        self.thumbnail_renders = 0
+        self.thumbnail_time = 0.0
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+
+    def metrics(self):
+        return {
+            'total_ms': ms(time.perf_counter() - self.started),
+            'sql_count': self.sql_count,
+            'sql_ms': ms(self.sql_time),
+            'template_ms': ms(self.template_time),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': ms(self.cache_time),
+            'thumbnail_count': self.thumbnail_count,
+            'thumbnail_renders': self.thumbnail_renders,
+            'thumbnail_ms': ms(self.thumbnail_time),
+        }
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def server_timing(metrics):
+    """Значение заголовка Server-Timing по итогам Profile.metrics().
+
+    В desc нет запятых и точек с запятой, чтобы заголовок разбирался
+    и без поддержки кавычек.
+    """
+    entries = [
+        ('sql', metrics['sql_ms'], f'{metrics["sql_count"]} queries'),
+        ('tpl', metrics['template_ms'], None),
+        ('cache', metrics['cache_ms'],
+         f'{metrics["cache_hits"]} hit {metrics["cache_misses"]} miss'),
+        ('thumb', metrics['thumbnail_ms'],
+         f'{metrics["thumbnail_count"]} '
+         f'({metrics["thumbnail_renders"]} rendered)'),
+        ('total', metrics['total_ms'], None),
+    ]
+    return ', '.join(
+        f'{name};dur={duration}' + (f';desc="{desc}"' if desc else '')
+        for name, duration, desc in entries
+    )
+
+
+def sample_rate(url_name, rates):
+    """Доля профилируемых запросов: по имени URL, иначе по '*'."""
+    if url_name in rates:
+        return rates[url_name]
+    return rates.get('*', 0)
+
+
+class ProfilingMiddleware:
+    """Профилирует долю запросов из PROFILING_SAMPLE_RATES.
+
+    Настройка - {'имя URL': доля от 0 до 1}, ключ '*' - для остальных.
+    Пока она пустая, запрос проходит без единой лишней проверки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rates = settings.PROFILING_SAMPLE_RATES
+
+    def __call__(self, request):
+        if not self.rates:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            request._profiling = stack
+            response = self.get_response(request)
+            profile = _current.get()
+            if profile is not None:
+                self.report(request, response, profile)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stack = getattr(request, '_profiling', None)
+        if stack is None:
+            return None
+        url_name = request.resolver_match.view_name
+        rate = sample_rate(url_name, self.rates)
+        if not rate or random.random() >= rate:
+            return None
+        profile = Profile()
+        token = _current.set(profile)
+        stack.callback(_current.reset, token)
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile.execute))
+        return None
+
+    def report(self, request, response, profile):
+        metrics = profile.metrics()
+        response['Server-Timing'] = server_timing(metrics)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'url_name': request.resolver_match.view_name,
+            'status': response.status_code,
+            **metrics,
+        }))
+
+
+def _template_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context)
+        # Вложенные include уже входят во время внешнего шаблона.
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_time += time.perf_counter() - start
+    return wrapper
+
+
+def _cache_call(method, count):
+    """Обёртка чтения кэша; count(аргументы, результат) -> (hits, misses).
+
+    Базовый get_many зовёт get по ключу: считается только внешний вызов.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None and not cache_listeners or _in_cache.get():
+            return method(self, *args, **kwargs)
+        if args and not hasattr(args[0], '__len__'):
+            # Ключи из генератора: count должен узнать, сколько их было.
+            args = (list(args[0]), *args[1:])
+        token = _in_cache.set(True)
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        finally:
+            _in_cache.reset(token)
+        elapsed = time.perf_counter() - start
+        hits, misses = count(args, kwargs, result)
+        if profile is not None:
+            profile.cache_time += elapsed
+            profile.cache_hits += hits
+            profile.cache_misses += misses
+        for listener in cache_listeners:
+            listener(self, hits, misses)
+        return result
+    return wrapper
+
+
+def _count_get(args, kwargs, value):
+    default = args[1] if len(args) > 1 else kwargs.get('default')
+    # Промах неотличим от сохранённого default; None в кэш не кладут.
+    if value is None or value is default:
+        return 0, 1
+    return 1, 0
+
+
+def _count_get_many(args, kwargs, values):
+    keys = args[0] if args else kwargs['keys']
+    return len(values), max(len(keys) - len(values), 0)
+
+
+def _get_thumbnail(get_thumbnail):
+    @wraps(get_thumbnail)
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return get_thumbnail(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return get_thumbnail(self, *args, **kwargs)
+        finally:
+            profile.thumbnail_time += time.perf_counter() - start
+            profile.thumbnail_count += 1
+    return wrapper
+
+
+def _create_thumbnail(create):
+    @wraps(create)
+    def wrapper(self, *args, **kwargs):
+        profile = _current.get()
+        if profile is not None:
+            profile.thumbnail_renders += 1
+        return create(self, *args, **kwargs)
+    return wrapper
+
+
+def _wrap(cls, name, decorator):
+    method = cls.__dict__.get(name)
+    if method is None or getattr(method, '_profiled', False):
+        return
+    wrapped = decorator(method)
+    wrapped._profiled = True
+    setattr(cls, name, wrapped)
+
+
+def install():
+    """Оборачивает рендер шаблонов, чтение кэшей и миниатюры sorl."""
+    from sorl.thumbnail.conf import settings as thumbnail_settings
+    from sorl.thumbnail.helpers import get_module_class
+
+    _wrap(Template, 'render', _template_render)
+    for alias in settings.CACHES:
+        for cls in type(caches[alias]).__mro__:
+            _wrap(cls, 'get', lambda get: _cache_call(get, _count_get))
+            _wrap(cls, 'get_many',
+                  lambda get_many: _cache_call(get_many, _count_get_many))
+    backend = get_module_class(thumbnail_settings.THUMBNAIL_BACKEND)
+    _wrap(backend, 'get_thumbnail', _get_thumbnail)
+    _wrap(backend, '_create_thumbnail', _create_thumbnail)
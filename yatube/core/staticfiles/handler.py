@@ -0,0 +1,126 @@
+import mimetypes
+import os
+import re
+from wsgiref.headers import Headers
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+
+# ManifestStaticFilesStorage вставляет в имя 12 символов md5.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Файлы без хэша в имени могут смениться при следующем деплое.
+SHORT = 'public, max-age=600'
+# Предпочтения сервера, если клиент умеет несколько кодировок.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещённых q=0."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        quality = 1.0
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    def __init__(self, path, name):
+        self.path = path
+        self.content_type = (
+            mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        )
+        self.cache_control = IMMUTABLE if HASHED_NAME.search(name) else SHORT
+        self.variants = {
+            coding: path + extension
+            for coding, extension in ENCODINGS
+            if os.path.isfile(path + extension)
+        }
+
+    def choose(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for coding, _ in ENCODINGS:
+            if coding in self.variants and (
+                    coding in accepted or '*' in accepted):
+                return coding, self.variants[coding]
+        return None, self.path
+
+
+class PrecompressedStaticFiles:
+    """WSGI-обёртка, которая сама отдаёт файлы из STATIC_ROOT.
+
+    Список файлов читается один раз при первом запросе, поэтому
+    на каждый ответ приходится один stat без обхода каталогов. Если
+    клиент принимает br или gzip и рядом лежит готовая копия,
+    отдаётся она; файлы с хэшем в имени кэшируются навсегда.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root
+        self.prefix = prefix
+        self.files = None
+
+    def load(self):
+        root = self.root or settings.STATIC_ROOT
+        prefix = self.prefix or settings.STATIC_URL
+        files = {}
+        if root and os.path.isdir(root):
+            for directory, _, names in os.walk(root):
+                for name in names:
+                    if name.endswith(('.gz', '.br')):
+                        continue
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, root).replace(
+                        os.sep, '/'
+                    )
+                    files[prefix + relative] = StaticFile(path, relative)
+        return files
+
+    def __call__(self, environ, start_response):
+        if self.files is None:
+            self.files = self.load()
+        static_file = self.files.get(environ.get('PATH_INFO', ''))
+        if static_file is None:
+            return self.application(environ, start_response)
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed',
+                           [('Allow', 'GET, HEAD')])
+            return []
+        return self.serve(static_file, environ, start_response, method)
+
+    def serve(self, static_file, environ, start_response, method):
+        coding, path = static_file.choose(
+            environ.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return self.application(environ, start_response)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = Headers([
+            ('Content-Type', static_file.content_type),
+            ('Cache-Control', static_file.cache_control),
+            ('Vary', 'Accept-Encoding'),
+            ('ETag', etag),
+        ])
+        if coding is not None:
+            headers['Content-Encoding'] = coding
+        if environ.get('HTTP_IF_NONE_MATCH') == etag:
+            start_response('304 Not Modified', headers.items())
+            return []
+        headers['Content-Length'] = str(stat.st_size)
+        start_response('200 OK', headers.items())
+        if method == 'HEAD':
+            return []
+        wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return wrapper(open(path, 'rb'), 64 * 1024)
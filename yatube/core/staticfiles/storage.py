@@ -0,0 +1,61 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него будут только .gz
+    brotli = None
+
+# Что имеет смысл сжимать: картинки и шрифты уже сжаты.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.txt', '.json', '.map',
+                '.xml', '.html')
+# Сжатая копия, которая экономит меньше этого, не нужна.
+MIN_RATIO = 0.95
+
+
+def _gzip(data):
+    # mtime=0: одинаковый вход даёт одинаковый .gz при каждой сборке.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic с хэшами в именах и заранее сжатыми копиями.
+
+    Рядом с каждым файлом из манифеста кладутся .gz и, если установлен
+    brotli, .br. Сжимаем один раз при сборке, а не на каждый ответ.
+    """
+
+    def encoders(self):
+        encoders = [('.gz', _gzip)]
+        if brotli is not None:
+            encoders.append(('.br', _brotli))
+        return encoders
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                for extension, compress in self.encoders():
+                    self.compress(name, extension, compress)
+
+    def compress(self, name, extension, compress):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        compressed = compress(data)
+        target = path + extension
+        if len(compressed) >= len(data) * MIN_RATIO:
+            if os.path.exists(target):
+                os.remove(target)
+            return
+        with open(target, 'wb') as output:
+            output.write(compressed)
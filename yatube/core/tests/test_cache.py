@@ -0,0 +1,73 @@
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache.sqlite import SQLiteCache
+
+
+def write_from_child(path):
+    cache = SQLiteCache(path, {})
+    cache.set('from_child', 'привет')
+    cache.incr('counter', 5)
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_get_set_many(self):
+        """set_many/get_many возвращают только найденные ключи"""
+        self.cache.set_many({'a': 1, 'b': [2, 3]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2, 3]})
+
+    def test_expiry_and_add(self):
+        """Просроченный ключ не виден, и add снова может его записать"""
+        self.cache.set('key', 'old', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr работает атомарно и падает на отсутствующем ключе"""
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 10), 11)
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные ключи"""
+        cache = SQLiteCache(
+            f'{self.directory}/small.sqlite3',
+            {'OPTIONS': {'MAX_SIZE': 20 * 1024}},
+        )
+        cache.touch_resolution = 0
+        cache.set('hot', 'x' * 1024)
+        for i in range(40):
+            cache.get('hot')
+            cache.set(f'cold:{i}', 'x' * 1024)
+        self.assertEqual(cache.get('hot'), 'x' * 1024)
+        self.assertIsNone(cache.get('cold:0'))
+        total, = cache._db.execute(
+            'SELECT total FROM cache_size').fetchone()
+        self.assertLessEqual(total, 20 * 1024)
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна в этом"""
+        self.cache.set('counter', 1)
+        process = multiprocessing.get_context('fork').Process(
+            target=write_from_child, args=(self.path,))
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('from_child'), 'привет')
+        self.assertEqual(self.cache.get('counter'), 6)
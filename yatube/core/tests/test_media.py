@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+CONTENT = bytes(range(256)) * 4
+NAME = 'posts/ab/' + 'ab' * 32 + '.jpg'
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, MEDIA_ACCEL=None)
+class ServeMediaTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(MEDIA_ROOT, 'posts', 'ab'))
+        cls.path = os.path.join(MEDIA_ROOT, NAME)
+        with open(cls.path, 'wb') as media:
+            media.write(CONTENT)
+        with open(os.path.join(MEDIA_ROOT, 'legacy.png'), 'wb') as media:
+            media.write(b'png')
+        for name in ('.blobs.lock', NAME + '.0123abcd.part'):
+            with open(os.path.join(MEDIA_ROOT, name), 'wb') as media:
+                media.write(b'')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, name=NAME, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_full_file(self):
+        """Файл отдаётся целиком с заголовками кэширования"""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable',
+                         self.get('legacy.png')['Cache-Control'])
+
+    def test_ranges(self):
+        """Range отдаёт только запрошенный кусок"""
+        cases = {
+            'bytes=10-19': (10, 19),
+            'bytes=1000-': (1000, len(CONTENT) - 1),
+            'bytes=-24': (len(CONTENT) - 24, len(CONTENT) - 1),
+            'bytes=1020-5000': (1020, len(CONTENT) - 1),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content),
+                                 CONTENT[start:end + 1])
+                self.assertEqual(response['Content-Range'],
+                                 f'bytes {start}-{end}/{len(CONTENT)}')
+
+    def test_unsatisfiable_and_stale_if_range(self):
+        """Диапазон за концом файла - 416, устаревший If-Range - весь файл"""
+        response = self.get(HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes */{len(CONTENT)}')
+
+        response = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_requests(self):
+        """ETag и If-Modified-Since дают 304 без тела"""
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        modified = http_date(os.stat(self.path).st_mtime)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date(0))
+        self.assertEqual(response.status_code, 200)
+
+    def test_accel_headers(self):
+        """С MEDIA_ACCEL тело отдаёт прокси"""
+        with self.settings(MEDIA_ACCEL='x-accel-redirect',
+                           MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/{NAME}')
+        self.assertEqual(response.content, b'')
+
+        with self.settings(MEDIA_ACCEL='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.path)
+
+    def test_outside_media_root(self):
+        """Пути за пределами MEDIA_ROOT и каталоги не отдаются"""
+        for name in ('../etc/passwd', 'posts', 'missing.jpg'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_storage_service_files(self):
+        """Блокировка хранилища и недописанные загрузки не отдаются"""
+        for name in ('.blobs.lock', NAME + '.0123abcd.part'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
@@ -0,0 +1,131 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Follow, Post
+
+User = get_user_model()
+METRICS_DIR = tempfile.mkdtemp()
+
+
+def count_from_child():
+    metrics.inc('yatube_requests_total', 5, view='posts:index',
+                method='GET', status=200)
+    metrics.flush(force=True)
+
+
+@override_settings(METRICS_DB=f'{METRICS_DIR}/metrics.sqlite3',
+                   METRICS_TOKEN='секрет')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Post.objects.create(author=cls.author, text='Пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        metrics._pending.clear()
+        metrics.flush(force=True)
+        with metrics._db() as db:
+            db.execute('DELETE FROM metrics')
+
+    def scrape(self):
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer секрет'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_requests_and_histograms(self):
+        """Счётчик запросов и гистограммы времени и SQL по имени URL."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        lines = self.scrape()
+        view = 'view="posts:index"'
+        self.assertIn(
+            f'yatube_requests_total{{method="GET",status="200",{view}}} 2',
+            lines,
+        )
+        self.assertIn(
+            f'yatube_request_duration_seconds_bucket{{{view},le="+Inf"}} 2',
+            lines,
+        )
+        self.assertIn(f'yatube_request_queries_count{{{view}}} 2', lines)
+        buckets = [
+            int(line.rsplit(' ', 1)[1]) for line in lines
+            if line.startswith(f'yatube_request_queries_bucket{{{view}')
+        ]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      lines)
+
+    def test_cache_hit_ratio(self):
+        """Доля попаданий в кэш считается по алиасу."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        ratio = [line for line in self.scrape()
+                 if line.startswith('yatube_cache_hit_ratio{')]
+        self.assertEqual(len(ratio), 1)
+        self.assertTrue(ratio[0].startswith(
+            'yatube_cache_hit_ratio{alias="default"} 0.'
+        ))
+
+    def test_thumbnail_queue_and_feed_build(self):
+        """Глубина очереди миниатюр и время раскладки лент."""
+        metrics.inc('yatube_thumbnail_jobs_submitted_total', 3)
+        metrics.inc('yatube_thumbnail_jobs_finished_total')
+        Follow.objects.create(user=self.reader, author=self.author)
+        lines = self.scrape()
+        self.assertIn('yatube_thumbnail_queue_depth 2', lines)
+        self.assertIn(
+            'yatube_feed_build_seconds_count{kind="backfill"} 1', lines
+        )
+
+    def test_sums_across_processes(self):
+        """Приращения другого процесса видны в общей выдаче."""
+        self.client.get(reverse('posts:index'))
+        child = multiprocessing.get_context('fork').Process(
+            target=count_from_child
+        )
+        child.start()
+        child.join()
+        self.assertIn(
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"} 6',
+            self.scrape(),
+        )
+
+    def test_requires_token(self):
+        """Без верного токена /metrics не видно, даже с localhost."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer чужой'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(
+                    '/metrics', REMOTE_ADDR='127.0.0.1', **headers
+                )
+                self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN=None):
+            response = self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer None'
+            )
+            self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_DB=None)
+    def test_disabled(self):
+        """Без METRICS_DB метрик нет, и ничего не копится в памяти."""
+        self.client.get(reverse('posts:index'))
+        metrics.inc('yatube_thumbnail_jobs_submitted_total')
+        self.assertFalse(metrics._pending)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
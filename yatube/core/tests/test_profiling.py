@@ -0,0 +1,122 @@
+import json
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from core.profiling import server_timing
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def timing(response):
+    """Метрики Server-Timing: {имя: {dur, desc}}."""
+    metrics = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_off_by_default(self):
+        """Без настройки заголовка нет и в лог ничего не пишется."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_SAMPLE_RATES={'posts:index': 1})
+    def test_header_and_log_line(self):
+        """Число запросов в заголовке и в логе совпадает с настоящим."""
+        with CaptureQueriesContext(connection) as queries, \
+                self.assertLogs('core.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        metrics = timing(response)
+        self.assertEqual(set(metrics),
+                         {'sql', 'tpl', 'cache', 'thumb', 'total'})
+        self.assertEqual(metrics['sql']['desc'],
+                         f'"{len(queries.captured_queries)} queries"')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['url_name'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['sql_count'], len(queries.captured_queries))
+        self.assertGreater(record['template_ms'], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATES={'posts:index': 1, '*': 0})
+    def test_per_url_rate(self):
+        """Доля задаётся по имени URL, '*' - для остальных страниц."""
+        response = self.client.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertFalse(response.has_header('Server-Timing'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    @override_settings(PROFILING_SAMPLE_RATES={'*': 1})
+    def test_cache_hits_and_misses(self):
+        """Страница из кэша - попадания без промахов и без SQL шаблона."""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+        cold, warm = [json.loads(record.getMessage())
+                      for record in logs.records]
+        self.assertGreater(cold['cache_misses'], 0)
+        self.assertGreater(warm['cache_hits'], 0)
+        self.assertEqual(warm['cache_misses'], 0)
+        self.assertEqual(warm['template_ms'], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATES={'*': 1})
+    def test_thumbnails(self):
+        """Миниатюры считаются отдельно: сколько взято и сколько нарезано."""
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'JPEG')
+        self.post.image = SimpleUploadedFile(
+            'red.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+        self.post.save()
+        address = reverse('posts:post_detail', args=[self.post.id])
+        variants = len(settings.THUMBNAIL_GEOMETRIES)
+        first = timing(self.client.get(address))
+        self.assertEqual(first['thumb']['desc'],
+                         f'"{variants} ({variants} rendered)"')
+        second = timing(self.client.get(address))
+        self.assertEqual(second['thumb']['desc'], f'"{variants} (0 rendered)"')
+
+    def test_server_timing_format(self):
+        """Формат заголовка: имя;dur=мс;desc="..." через запятую."""
+        header = server_timing({
+            'sql_ms': 1.5, 'sql_count': 3, 'template_ms': 2,
+            'cache_ms': 0.1, 'cache_hits': 1, 'cache_misses': 2,
+            'thumbnail_ms': 0, 'thumbnail_count': 0,
+            'thumbnail_renders': 0, 'total_ms': 9.25,
+        })
+        self.assertEqual(
+            header,
+            'sql;dur=1.5;desc="3 queries", tpl;dur=2, '
+            'cache;dur=0.1;desc="1 hit 2 miss", '
+            'thumb;dur=0;desc="0 (0 rendered)", total;dur=9.25',
+        )
@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.staticfiles.handler import PrecompressedStaticFiles
+
+STORAGE = 'core.staticfiles.storage.CompressedManifestStaticFilesStorage'
+
+
+def not_found(environ, start_response):
+    start_response('404 Not Found', [])
+    return [b'app']
+
+
+class PrecompressedStaticFilesTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        with override_settings(STATIC_ROOT=cls.root,
+                               STATICFILES_STORAGE=STORAGE):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(cls.root, 'staticfiles.json')) as manifest:
+            cls.css = json.load(manifest)['paths']['css/bootstrap.min.css']
+        cls.app = PrecompressedStaticFiles(
+            not_found, root=cls.root, prefix='/static/'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def request(self, path, **extra):
+        environ = {'PATH_INFO': path, **extra}
+        setup_testing_defaults(environ)
+        response = {}
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = b''.join(self.app(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """collectstatic кладёт .gz рядом с файлом, у которого хэш в имени"""
+        path = os.path.join(self.root, self.css)
+        self.assertNotEqual(self.css, 'css/bootstrap.min.css')
+        self.assertTrue(os.path.exists(path + '.gz'))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, 'img', 'logo.png.gz')))
+
+    def test_serves_gzip_with_immutable_cache(self):
+        """Клиенту с gzip отдаётся готовая сжатая копия навсегда"""
+        status, headers, body = self.request(
+            f'/static/{self.css}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        with open(os.path.join(self.root, self.css), 'rb') as original:
+            self.assertEqual(gzip.decompress(body), original.read())
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+    def test_identity_and_revalidation(self):
+        """Без Accept-Encoding файл отдаётся как есть, ETag даёт 304"""
+        status, headers, body = self.request(
+            f'/static/{self.css}', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+
+        status, _, body = self.request(
+            f'/static/{self.css}', HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, b'')
+
+    def test_unknown_path_goes_to_application(self):
+        """Всё, чего нет в STATIC_ROOT, обрабатывает Django"""
+        status, _, body = self.request('/static/../settings.py')
+        self.assertEqual(status, '404 Not Found')
+        self.assertEqual(body, b'app')
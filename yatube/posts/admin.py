@@ -1,9 +1,64 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.forms import BaseModelFormSet
 
 from .models import Group, Post
+from .search import fts_query, is_supported, matching_ids
+from .utils import EstimatedPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class RowAutocompleteSelect(AutocompleteSelect):
+    """Autocomplete, который берёт выбранный объект из строки списка.
+
+    Обычный виджет ищет выбранное значение отдельным запросом, и
+    в list_editable это запрос на каждую строку.
+    """
+
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or [str(selected.pk)] != [str(v) for v in value]:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        label = self.choices.field.label_from_instance(selected)
+        options.append(self.create_option(
+            name, selected.pk, label, True, len(options)
+        ))
+        return [(None, options, 0)]
+
+
+class ChangelistFormSet(BaseModelFormSet):
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        for name, field in form.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, RowAutocompleteSelect):
+                # Связанный объект уже пришёл в list_select_related.
+                widget.selected = getattr(form.instance, name)
+        return form
+
+
+class EstimatedCountAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице, см. EstimatedPaginator."""
+
+    paginator = EstimatedPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        try:
+            number = int(request.GET.get(PAGE_VAR, 0)) + 1
+        except ValueError:
+            number = 1
+        return self.paginator(queryset, per_page, orphans,
+                              allow_empty_first_page, number=number)
+
+
+class PostAdmin(EstimatedCountAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,23 +67,49 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.autocomplete_fields:
+            kwargs['widget'] = RowAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'),
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs['formset'] = ChangelistFormSet
+        return super().get_changelist_formset(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # icontains по тексту - полный просмотр таблицы, берём FTS5.
+        if not is_supported() or fts_query(search_term) is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        # RawSQL в id__in Django 2.2 берёт в двойные скобки, и SQLite
+        # читает подзапрос как скалярный - остаётся одна строка.
+        sql, params = matching_ids(search_term)
+        where = f'{Post._meta.db_table}.id IN ({sql})'
+        return queryset.extra(where=[where], params=params), False
+
 
 # класс PostAdmin
 admin.site.register(Post, PostAdmin)
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(EstimatedCountAdmin):
     list_display = (
         'pk',
         'title',
         'slug',
         'description',
     )
-    search_fields = ('text',)
+    search_fields = ('title', 'slug')
     list_filter = ('title',)
     empty_value_display = '-пусто-'
 
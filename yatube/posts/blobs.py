@@ -0,0 +1,99 @@
+import os
+import posixpath
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+from sorl.thumbnail import delete
+
+from .models import ImageBlob, Post
+from .thumbnails import post_image
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def _is_fresh(name, grace):
+    try:
+        modified = os.path.getmtime(_storage().path(name))
+    except FileNotFoundError:
+        return False
+    return time.time() - modified < grace
+
+
+def _is_referenced(name):
+    return Post.objects.filter(image=name).exists()
+
+
+def _remove(name):
+    """Удаляет файл вместе с миниатюрами и записями sorl о нём."""
+    delete(post_image(name))
+
+
+def collect_unreferenced(grace, dry_run=False):
+    """Удаляет файлы с нулём ссылок старше grace секунд."""
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    candidates = ImageBlob.objects.filter(
+        refs=0, created__lt=cutoff
+    ).values_list('name', flat=True)
+    removed = []
+    for name in list(candidates):
+        if _is_referenced(name):
+            # Счётчик разошёлся с таблицей постов - чиним, файл оставляем.
+            ImageBlob.objects.filter(name=name).update(
+                refs=Post.objects.filter(image=name).count()
+            )
+            continue
+        if _is_fresh(name, grace):
+            continue
+        if not dry_run:
+            with _storage().lock():
+                # Под замком загрузка не может переиспользовать файл.
+                # Свежесть и refs=0 ещё раз: пока мы проверяли, файл
+                # мог снова понадобиться.
+                if _is_fresh(name, grace):
+                    continue
+                deleted, _ = ImageBlob.objects.filter(
+                    name=name, refs=0
+                ).delete()
+                if not deleted:
+                    continue
+                _remove(name)
+        removed.append(name)
+    return removed
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from _walk(storage, posixpath.join(directory, subdirectory))
+
+
+def collect_untracked(grace, dry_run=False):
+    """Удаляет из каталога загрузок файлы, о которых не знает ImageBlob.
+
+    Это недописанные загрузки, посты, которые так и не сохранились,
+    и файлы, оставшиеся с тех времён, когда ссылки не считались.
+    """
+    storage = _storage()
+    root = Post._meta.get_field('image').upload_to.rstrip('/')
+    if not storage.exists(root):
+        return []
+    tracked = set(ImageBlob.objects.values_list('name', flat=True))
+    removed = []
+    for name in _walk(storage, root):
+        if name in tracked or _is_fresh(name, grace):
+            continue
+        if _is_referenced(name):
+            continue
+        if not dry_run:
+            with storage.lock():
+                if (_is_fresh(name, grace)
+                        or ImageBlob.objects.filter(name=name).exists()):
+                    continue
+                _remove(name)
+        removed.append(name)
+    return removed
@@ -0,0 +1,68 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+
+GENERATION_KEY = 'generation:{}'
+
+
+def generation_key(scope):
+    # В области бывают слаги и имена с кириллицей и пробелами, а
+    # memcached принимает только короткие ASCII-ключи без пробелов.
+    return GENERATION_KEY.format(
+        hashlib.md5(scope.encode()).hexdigest()
+    )
+
+
+def _fresh_generation():
+    # Начинаем не с единицы, чтобы после вытеснения ключа поколения
+    # не воскресить страницы, закэшированные под старым номером.
+    return time.time_ns()
+
+
+def generations(scopes):
+    """Номера поколений для областей: global, group:<slug>, author:<имя>."""
+    keys = [generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _fresh_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(scopes):
+    """Сдвигает поколения: всё, что закэшировано под старыми, устаревает."""
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), None)
+
+
+def cache_page_by_generation(scopes_for):
+    """cache_page, ключ которого включает поколения областей страницы.
+
+    scopes_for получает аргументы view и возвращает список областей.
+    TTL можно держать большим: новые посты сдвигают поколение, и
+    страница пересобирается сразу.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = scopes_for(*args, **kwargs)
+            state = ','.join(
+                f'{scope}={generation}' for scope, generation
+                in zip(scopes, generations(scopes))
+            )
+            key_prefix = hashlib.md5(state.encode()).hexdigest()
+            cached_view = cache_page(
+                settings.POSTS_CACHE_TIMEOUT, key_prefix=key_prefix
+            )(view)
+            return cached_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, Sum
+
+from .models import AuthorStats, Comment, ImageBlob, Post, User
+
+COUNT_KEY = 'count:{}'
+
+
+def post_scopes(group_id=None):
+    """Области подсчёта, в которые входит пост.
+
+    Посты автора считает AuthorStats.posts_count, своей области у
+    автора нет.
+    """
+    scopes = ['global']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def change_counts(scopes, delta):
+    for scope in scopes:
+        try:
+            cache.incr(COUNT_KEY.format(scope), delta)
+        except ValueError:
+            # Холодный счётчик: при чтении будет посчитан или оценён.
+            pass
+
+
+def estimate(scope, queryset):
+    """Считает строки, но не дальше COUNTS_EXACT_LIMIT.
+
+    Возвращает пару (значение, точное ли оно). Для глобальной области
+    большой таблицы оценка берётся по диапазону первичного ключа.
+    """
+    limit = settings.COUNTS_EXACT_LIMIT
+    total = queryset.order_by()[:limit + 1].count()
+    if total <= limit:
+        return total, True
+    if scope == 'global':
+        bounds = Post.objects.aggregate(low=Min('id'), high=Max('id'))
+        return bounds['high'] - bounds['low'] + 1, False
+    return limit, False
+
+
+def _remember(scope, value, exact):
+    if exact:
+        timeout = settings.COUNTS_EXACT_TIMEOUT
+    else:
+        timeout = settings.COUNTS_ESTIMATE_TIMEOUT
+    cache.set(COUNT_KEY.format(scope), value, timeout)
+
+
+def count(scope, queryset):
+    """Число постов в области: из счётчика, а если он холодный - оценка."""
+    if scope.startswith('feed:'):
+        return feed_count(int(scope.split(':')[1]))
+    value = cache.get(COUNT_KEY.format(scope))
+    if value is None:
+        value, exact = estimate(scope, queryset)
+        _remember(scope, value, exact)
+    return value
+
+
+def feed_count(user_id):
+    """Размер ленты подписок - сумма posts_count авторов, без fan-out."""
+    return AuthorStats.objects.filter(
+        author__following__user_id=user_id
+    ).aggregate(total=Sum('posts_count'))['total'] or 0
+
+
+def change_posts_count(author_id, delta):
+    """Атомарно сдвигает счётчик постов автора через F()."""
+    stats = AuthorStats.objects.filter(author_id=author_id)
+    if delta < 0:
+        stats = stats.filter(posts_count__gte=-delta)
+    else:
+        AuthorStats.objects.get_or_create(author_id=author_id)
+    stats.update(posts_count=F('posts_count') + delta)
+
+
+def change_comments_count(post_id, delta):
+    """Атомарно сдвигает счётчик комментариев поста через F()."""
+    posts = Post.objects.filter(id=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def change_image_refs(name, delta):
+    """Атомарно сдвигает число ссылок на файл картинки через F()."""
+    blobs = ImageBlob.objects.filter(name=name)
+    if delta < 0:
+        blobs = blobs.filter(refs__gte=-delta)
+    else:
+        ImageBlob.objects.get_or_create(name=name)
+    blobs.update(refs=F('refs') + delta)
+
+
+def _id_batches(queryset, batch_size):
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    last_id = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def reconcile_comments_count(batch_size):
+    """Чинит расхождения comments_count пачками; возвращает число правок."""
+    fixed = 0
+    for batch in _id_batches(Post.objects.all(), batch_size):
+        actual = dict(
+            Comment.objects.filter(post_id__in=batch).order_by()
+            .values_list('post_id').annotate(total=Count('id'))
+        )
+        drifted = [
+            Post(id=post_id, comments_count=actual.get(post_id, 0))
+            for post_id, stored in Post.objects.filter(id__in=batch)
+            .values_list('id', 'comments_count')
+            if stored != actual.get(post_id, 0)
+        ]
+        Post.objects.bulk_update(drifted, ['comments_count'])
+        fixed += len(drifted)
+    return fixed
+
+
+def reconcile_posts_count(batch_size):
+    """Чинит расхождения posts_count авторов пачками."""
+    fixed = 0
+    for batch in _id_batches(User.objects.all(), batch_size):
+        actual = dict(
+            Post.objects.filter(author_id__in=batch).order_by()
+            .values_list('author_id').annotate(total=Count('id'))
+        )
+        stored = dict(
+            AuthorStats.objects.filter(author_id__in=batch)
+            .values_list('author_id', 'posts_count')
+        )
+        missing = [
+            AuthorStats(author_id=author_id, posts_count=total)
+            for author_id, total in actual.items()
+            if author_id not in stored
+        ]
+        drifted = [
+            AuthorStats(author_id=author_id,
+                        posts_count=actual.get(author_id, 0))
+            for author_id, stored_count in stored.items()
+            if stored_count != actual.get(author_id, 0)
+        ]
+        AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+        AuthorStats.objects.bulk_update(drifted, ['posts_count'])
+        fixed += len(missing) + len(drifted)
+    return fixed
@@ -0,0 +1,235 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from core import metrics
+
+from .models import AuthorStats, Follow, Post, Timeline
+from .utils import KeysetPaginator, MergedKeysetPaginator
+
+FOLLOWERS_KEY = 'feed:followers:{}'
+
+
+def followers_count(author_ids):
+    """Число подписчиков для каждого автора; счётчики живут в кэше."""
+    keys = {FOLLOWERS_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    counts = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = set(author_ids) - set(counts)
+    if missing:
+        fresh = dict.fromkeys(missing, 0)
+        fresh.update(
+            Follow.objects.filter(author_id__in=missing)
+            .values_list('author_id')
+            .annotate(total=Count('id'))
+        )
+        cache.set_many(
+            {FOLLOWERS_KEY.format(author_id): total
+             for author_id, total in fresh.items()},
+            timeout=settings.COUNTS_EXACT_TIMEOUT,
+        )
+        counts.update(fresh)
+    return counts
+
+
+def change_followers_count(author_id, delta):
+    try:
+        cache.incr(FOLLOWERS_KEY.format(author_id), delta)
+    except ValueError:
+        # Холодный счётчик посчитается заново при следующем чтении.
+        pass
+
+
+def is_pull_author(author_id):
+    """Посты авторов с большим числом подписчиков читаются при показе."""
+    threshold = settings.FEED_FANOUT_THRESHOLD
+    return followers_count([author_id])[author_id] > threshold
+
+
+def pull_authors(user):
+    """Авторы из подписок, чьи посты не все разложены по лентам."""
+    return list(AuthorStats.objects.filter(
+        author__following__user=user, feed_pull=True
+    ).values_list('author_id', flat=True))
+
+
+def mark_pull_authors(author_ids):
+    """Отмечает авторов, чьи посты лента будет дочитывать при показе."""
+    author_ids = set(author_ids)
+    marked = AuthorStats.objects.filter(
+        author_id__in=author_ids
+    ).update(feed_pull=True)
+    if marked < len(author_ids):
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(author_id=author_id, feed_pull=True)
+             for author_id in author_ids],
+            ignore_conflicts=True,
+        )
+
+
+def feed_paginator(user):
+    """Лента подписок: материализованная часть плюс посты pull-авторов.
+
+    Посты всех pull-авторов читаются одним запросом, поэтому страница
+    стоит два запроса при любом числе подписок на крупных авторов.
+    """
+    per_page = settings.POSTS_LIMIT
+    streams = [KeysetPaginator(
+        user.timeline.select_related('post__author', 'post__group'),
+        per_page, pk_field='post_id', related='post',
+    )]
+    pull_ids = pull_authors(user)
+    if pull_ids:
+        streams.append(KeysetPaginator(
+            Post.objects.filter(author_id__in=pull_ids)
+            .select_related('author', 'group'),
+            per_page,
+        ))
+    return MergedKeysetPaginator(streams, per_page)
+
+
+def _bulk_insert(entries):
+    """Пишет строки ленты пачками, не собирая их все в памяти."""
+    batch_size = settings.FEED_BATCH_SIZE
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fanout_post(post):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    if is_pull_author(post.author_id):
+        mark_pull_authors([post.author_id])
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    with metrics.timer('yatube_feed_build_seconds', kind='fanout'):
+        _bulk_insert(
+            Timeline(
+                user_id=user_id,
+                post_id=post.id,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        )
+
+
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту читателя уже опубликованные посты автора."""
+    if is_pull_author(author_id):
+        mark_pull_authors([author_id])
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    with metrics.timer('yatube_feed_build_seconds', kind='backfill'):
+        _bulk_insert(
+            Timeline(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts.iterator()
+        )
+
+
+def purge_timeline(user_id, author_id):
+    """Убирает из ленты читателя посты автора, от которого он отписался."""
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def settle_pull_author(author_id):
+    """Раскладывает посты бывшего pull-автора, если он ушёл под порог.
+
+    Пока автор был выше FEED_FANOUT_THRESHOLD, его посты в ленты не
+    писались. Отметка снимается в той же транзакции, что пишет строки
+    лент, поэтому лента видит посты либо через дочитывание, либо в
+    таблице, но не теряет их.
+    """
+    followers = Follow.objects.filter(author_id=author_id)
+    with transaction.atomic():
+        total = followers.count()
+        if total > settings.FEED_FANOUT_THRESHOLD:
+            return
+        settled = AuthorStats.objects.filter(
+            author_id=author_id, feed_pull=True
+        ).update(feed_pull=False)
+        if not settled:
+            return
+        cache.set(FOLLOWERS_KEY.format(author_id), total,
+                  timeout=settings.COUNTS_EXACT_TIMEOUT)
+        user_ids = list(followers.values_list('user_id', flat=True))
+        posts = Post.objects.filter(
+            author_id=author_id
+        ).values_list('id', 'pub_date')
+        with metrics.timer('yatube_feed_build_seconds', kind='settle'):
+            _bulk_insert(
+                Timeline(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for post_id, pub_date in posts.iterator()
+                for user_id in user_ids
+            )
+
+
+def rebuild_timelines():
+    """Пересобирает все ленты с нуля по таблице подписок.
+
+    Каждая лента стирается и собирается заново в своей транзакции,
+    поэтому читатель видит либо старую ленту, либо новую, но не пустую.
+    Заодно приводит ленты в порядок после того, как автор перешёл
+    порог FEED_FANOUT_THRESHOLD в любую сторону.
+    """
+    pull_ids = set(
+        Follow.objects.order_by().values_list('author_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=settings.FEED_FANOUT_THRESHOLD)
+        .values_list('author_id', flat=True)
+    )
+    mark_pull_authors(pull_ids)
+    user_ids = set(Follow.objects.values_list('user_id', flat=True))
+    user_ids.update(
+        Timeline.objects.order_by().values_list('user_id', flat=True)
+        .distinct()
+    )
+    rebuilt = 0
+    for user_id in sorted(user_ids):
+        author_ids = set(Follow.objects.filter(
+            user_id=user_id
+        ).values_list('author_id', flat=True))
+        posts = Post.objects.filter(
+            author_id__in=author_ids - pull_ids
+        ).values_list('id', 'author_id', 'pub_date')
+        with transaction.atomic(), metrics.timer(
+            'yatube_feed_build_seconds', kind='rebuild'
+        ):
+            Timeline.objects.filter(user_id=user_id).delete()
+            _bulk_insert(
+                Timeline(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for post_id, author_id, pub_date in posts.iterator()
+            )
+        rebuilt += len(author_ids)
+    # Посты остальных авторов теперь лежат в лентах.
+    AuthorStats.objects.filter(feed_pull=True).exclude(
+        author_id__in=pull_ids
+    ).update(feed_pull=False)
+    return rebuilt
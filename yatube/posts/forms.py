@@ -1,12 +1,14 @@
 from django import forms
 
 from .models import Comment, Post
+from .uploads import PostImageField
 
 
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
+        field_classes = {'image': PostImageField}
         help_text = {
             'text': 'Текст поста',
             'group': 'Группа',
@@ -0,0 +1,97 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore, EMPTY_VALUE
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class PrefetchingKVStore(KVStore):
+    """KV-хранилище sorl, которое умеет читать записи пачкой.
+
+    Внутри prefetch() записи миниатюр страницы берутся из памяти,
+    поэтому теги {% thumbnail %} больше не ходят в кэш и БД по одному.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    @property
+    def _memo(self):
+        return getattr(self._local, 'memo', None)
+
+    def _get_raw(self, key):
+        memo = self._memo
+        if memo is None or key not in memo:
+            return super()._get_raw(key)
+        value = memo[key]
+        return None if value is EMPTY_VALUE else value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        if self._memo is not None:
+            self._memo[key] = value
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        memo = self._memo
+        if memo is not None:
+            for key in keys:
+                memo.pop(key, None)
+
+    def _load(self, keys):
+        """Одно обращение к кэшу и не больше одного запроса в БД."""
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(
+                KVStoreModel.objects.filter(key__in=missing)
+                .values_list('key', 'value')
+            )
+            if found:
+                self.cache.set_many(
+                    found, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+                )
+            for key in missing:
+                values[key] = found.get(key, EMPTY_VALUE)
+        return values
+
+    @contextmanager
+    def prefetch(self, images):
+        """Заранее читает записи всех THUMBNAIL_GEOMETRIES для картинок."""
+        keys = [
+            add_prefix(thumbnail_key(image, geometry, options))
+            for image in images if image
+            for geometry, options in settings.THUMBNAIL_GEOMETRIES
+        ]
+        outer = self._memo
+        self._local.memo = dict(outer or {})
+        try:
+            if keys:
+                self._memo.update(self._load(keys))
+            yield
+        finally:
+            self._local.memo = outer
+
+
+def thumbnail_key(image, geometry, options):
+    """Ключ записи миниатюры - так же, как его строит get_thumbnail."""
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(thumbnail_settings, attr)
+        if value != getattr(defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage).key
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import get_thumbnail
+
+from posts.models import Post
+from posts.templatetags.post_images import image_variants
+
+# Как раньше: одна обрезка 960x339 в JPEG для всех экранов.
+LEGACY_GEOMETRY = '960x339'
+LEGACY_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширина экрана в CSS-пикселях и плотность пикселей.
+VIEWPORTS = [(360, 1), (360, 2), (414, 3), (768, 1), (1280, 1), (1920, 2)]
+# Шире карточка не бывает, см. DEFAULT_SIZES.
+MAX_SLOT = 960
+
+
+def pick(thumbnails, width):
+    """Кандидат, которого выберет браузер: самый узкий не уже слота."""
+    for thumbnail in thumbnails:
+        if thumbnail.width >= width:
+            return thumbnail
+    return thumbnails[-1]
+
+
+def size(thumbnail):
+    return thumbnail.storage.size(thumbnail.name)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает вес картинок первой страницы ленты до и после '
+            'адаптивных вариантов')
+
+    def handle(self, *args, **options):
+        images = [
+            post.image for post in Post.objects.all()[:settings.POSTS_LIMIT]
+            if post.image
+        ]
+        if not images:
+            self.stdout.write('На первой странице нет картинок')
+            return
+        legacy = sum(
+            size(get_thumbnail(image, LEGACY_GEOMETRY, **LEGACY_OPTIONS))
+            for image in images
+        )
+        variants = [image_variants(image) for image in images]
+        self.stdout.write(
+            f'Картинок на странице: {len(images)}, '
+            f'раньше: {legacy // 1024} КБ'
+        )
+        for viewport, density in VIEWPORTS:
+            slot = min(viewport, MAX_SLOT) * density
+            totals = {
+                image_format: sum(
+                    size(pick(variant[image_format], slot))
+                    for variant in variants
+                )
+                for image_format in settings.POST_IMAGE_FORMATS
+            }
+            line = ', '.join(
+                f'{image_format}: {total // 1024} КБ '
+                f'({100 * total // legacy}%)'
+                for image_format, total in totals.items()
+            )
+            self.stdout.write(f'{viewport}px@{density}x - {line}')
@@ -0,0 +1,137 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import INDEX_SQL, RANK_WINDOW, fts_query, ranked_sql
+
+# Словарь с частотами по закону Ципфа: как в живых текстах, немногие
+# слова встречаются почти везде, а большинство - редко.
+VOCABULARY = 20000
+WORDS_PER_POST = (8, 60)
+LETTERS = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+# Запросы - ранги слов в словаре; префикс - первые буквы слова.
+QUERIES = {
+    'частое слово': [1],
+    'среднее слово': [300],
+    'редкое слово': [15000],
+    'два слова': [5, 40],
+    'префикс из 3 букв': [123],
+}
+SCHEMA = """
+    CREATE TABLE posts_post (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        text text NOT NULL
+    )
+"""
+
+
+def vocabulary(rng):
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add(''.join(rng.choices(LETTERS, k=rng.randint(3, 10))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def zipf_words(rng, words, count):
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    while True:
+        yield from rng.choices(words, weights, k=count)
+
+
+def timed(callback, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = callback()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск FTS5 с LIKE на отдельной базе SQLite '
+            'с синтетическими постами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def fill(self, db, total, rng, vocabulary):
+        words = zipf_words(rng, vocabulary, 100_000)
+        low, high = WORDS_PER_POST
+        start = time.perf_counter()
+        batch = 10_000
+        for offset in range(0, total, batch):
+            db.executemany(
+                'INSERT INTO posts_post (text) VALUES (?)',
+                (
+                    (' '.join(next(words)
+                              for _ in range(rng.randint(low, high))),)
+                    for _ in range(min(batch, total - offset))
+                ),
+            )
+        db.commit()
+        self.stdout.write(
+            f'Постов: {total}, вставка с триггерами: '
+            f'{time.perf_counter() - start:.1f} с'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = vocabulary(rng)
+        per_page = options['per_page']
+        repeat = options['repeat']
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute(SCHEMA)
+            for statement in INDEX_SQL:
+                db.execute(statement)
+            self.fill(db, options['posts'], rng, words)
+            first_sql = ranked_sql().replace('%s', '?')
+            next_sql = ranked_sql(cursor=True).replace('%s', '?')
+            like_sql = (
+                'SELECT id FROM posts_post WHERE text LIKE ? '
+                'ORDER BY id DESC LIMIT ?'
+            )
+            for label, ranks in QUERIES.items():
+                text = ' '.join(words[rank - 1] for rank in ranks)
+                if label.startswith('префикс'):
+                    text = text[:3]
+                query = fts_query(text)
+                window = [query, query, RANK_WINDOW - 1]
+                fts_ms, rows = timed(
+                    lambda: db.execute(
+                        first_sql, [*window, per_page + 1]
+                    ).fetchall(),
+                    repeat,
+                )
+                next_ms = 0.0
+                if len(rows) > per_page:
+                    pk, score = rows[per_page - 1]
+                    next_ms, _ = timed(
+                        lambda: db.execute(
+                            next_sql,
+                            [*window, score, score, pk, per_page + 1],
+                        ).fetchall(),
+                        repeat,
+                    )
+                like = '%' + '%'.join(text.split()) + '%'
+                like_ms, _ = timed(
+                    lambda: db.execute(
+                        like_sql, [like, per_page + 1]
+                    ).fetchall(),
+                    repeat,
+                )
+                self.stdout.write(
+                    f'{label} ({text}): FTS5 {fts_ms:.1f} мс, '
+                    f'следующая страница {next_ms:.1f} мс, '
+                    f'LIKE {like_ms:.1f} мс'
+                )
+            db.close()
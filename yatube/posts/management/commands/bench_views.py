@@ -0,0 +1,308 @@
+import json
+import math
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import AuthorStats, Follow, Group, Post, User
+
+# Сравниваются с эталоном; время - с порогом, число запросов - точно.
+METRICS = ('p50_ms', 'p95_ms', 'queries', 'db_steps')
+EXACT_METRICS = ('queries',)
+# Шагов виртуальной машины SQLite между вызовами счётчика.
+STEP_GRANULARITY = 1000
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу: значение из самой выборки."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(share * len(ordered)))
+    return ordered[rank - 1]
+
+
+class StepCounter:
+    """Сколько работы сделала SQLite: шаги виртуальной машины, в тысячах.
+
+    SQLite не сообщает, сколько строк прочитал запрос, а число шагов
+    растёт вместе с ним: полный проход по таблице виден сразу.
+    """
+
+    def __init__(self):
+        self.steps = 0
+
+    def tick(self):
+        self.steps += 1
+        return 0
+
+    def __enter__(self):
+        if connection.vendor == 'sqlite':
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(
+                self.tick, STEP_GRANULARITY
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if connection.vendor == 'sqlite':
+            connection.connection.set_progress_handler(None, 0)
+
+
+def isolated_settings(fanout_threshold):
+    """Настройки замера: свой кэш в памяти и без записи метрик.
+
+    Холодный замер чистит кэш, а с боевыми настройками это общий
+    SQLiteCache со страницами, счётчиками и записями sorl.
+    """
+    return override_settings(
+        CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench_views',
+        }},
+        METRICS_DB=None,
+        FEED_FANOUT_THRESHOLD=fanout_threshold,
+    )
+
+
+def measure(request, repeat, cold=True):
+    """Задержки, число запросов и шаги базы для repeat вызовов request.
+
+    request() делает запрос клиентом и возвращает ответ. С cold кэш
+    чистится перед каждым вызовом, и меряется путь через базу.
+    """
+    timings = []
+    queries = []
+    steps = []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        # Журнал запросов ограничен: переполненный он врёт о их числе.
+        reset_queries()
+        with CaptureQueriesContext(connection) as context, \
+                StepCounter() as counter:
+            start = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise CommandError(f'Ответ {response.status_code}')
+        queries.append(len(context.captured_queries))
+        steps.append(counter.steps)
+    return {
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': max(queries),
+        'db_steps': max(steps),
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms=0):
+    """Регрессии относительно эталона: строки для отчёта.
+
+    Метрики EXACT_METRICS не должны расти вовсе, остальные - больше,
+    чем в 1 + threshold раз. Время ещё и не меньше чем на min_delta_ms:
+    p95 быстрых страниц пляшет на пару миллисекунд от запуска к запуску.
+    Чего нет в эталоне, не сравнивается.
+    """
+    regressions = []
+    for scale, views in results['scales'].items():
+        base_views = baseline.get('scales', {}).get(scale, {})
+        for view, metrics in views.items():
+            base = base_views.get(view, {})
+            for metric in METRICS:
+                if metric not in base or metric not in metrics:
+                    continue
+                limit = base[metric]
+                if metric not in EXACT_METRICS:
+                    limit *= 1 + threshold
+                if metric.endswith('_ms'):
+                    limit = max(limit, base[metric] + min_delta_ms)
+                if metrics[metric] > limit:
+                    regressions.append(
+                        f'{scale} {view} {metric}: '
+                        f'{base[metric]} -> {metrics[metric]}'
+                    )
+    return regressions
+
+
+def scale_options(posts):
+    """Объём остальных таблиц под число постов, как на живом сайте."""
+    users = max(100, posts // 10)
+    return {
+        'posts': posts,
+        'users': users,
+        'groups': max(10, posts // 1000),
+        'comments': posts,
+        'follows': users * 10,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Меряет задержки, число запросов и работу базы основных '
+            'страниц на синтетических данных разного объёма и '
+            'сравнивает с эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='10000,100000,1000000',
+            help='Число постов в базах через запятую',
+        )
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--fanout-threshold', type=int, default=100,
+            help='FEED_FANOUT_THRESHOLD на время замера. С порогом сайта '
+                 'на степенных данных ленты растут до сотен миллионов строк',
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не чистить кэш перед запросами',
+        )
+        parser.add_argument(
+            '--data-dir',
+            help='Где хранить заполненные базы между запусками; '
+                 'по умолчанию - временный каталог',
+        )
+        parser.add_argument('--output', default='bench_views.json')
+        parser.add_argument('--baseline', help='JSON прошлого запуска')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост времени и шагов базы, доля',
+        )
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=5,
+            help='Меньший рост времени регрессией не считается',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales: числа через запятую')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        results = {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'repeat': options['repeat'],
+            'cold_cache': not options['warm'],
+            'fanout_threshold': options['fanout_threshold'],
+            'scales': {},
+        }
+        isolated = isolated_settings(options['fanout_threshold'])
+        with tempfile.TemporaryDirectory() as directory, isolated:
+            data_dir = options['data_dir'] or directory
+            for posts in scales:
+                results['scales'][str(posts)] = self.bench_scale(
+                    posts, os.path.join(data_dir, f'bench_{posts}.sqlite3'),
+                    options,
+                )
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты: {options["output"]}')
+        if baseline is None:
+            return
+        regressions = compare(
+            results, baseline, options['threshold'], options['min_delta_ms']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно эталона:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def bench_scale(self, posts, path, options):
+        """Отдельная база на объём: заполняется один раз и не меняется."""
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        old_test_name = test_settings.get('NAME')
+        test_settings['NAME'] = path
+        keep = os.path.exists(path)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=keep,
+        )
+        try:
+            if not keep:
+                start = time.perf_counter()
+                call_command(
+                    'seed_yatube', seed=options['seed'],
+                    workers=options['workers'], stdout=StringIO(),
+                    **scale_options(posts),
+                )
+                self.stdout.write(
+                    f'{posts}: заполнено за '
+                    f'{time.perf_counter() - start:.0f} с'
+                )
+            with transaction.atomic():
+                views = self.bench_views(options)
+                # Созданные посты и комментарии не попадут в базу, и
+                # следующий запуск увидит те же данные.
+                transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=bool(options['data_dir']),
+            )
+            test_settings['NAME'] = old_test_name
+        for view, metrics in views.items():
+            self.stdout.write(
+                f'{posts} {view}: p50 {metrics["p50_ms"]} мс, '
+                f'p95 {metrics["p95_ms"]} мс, '
+                f'запросов {metrics["queries"]}, '
+                f'шагов базы {metrics["db_steps"]}k'
+            )
+        return views
+
+    def bench_views(self, options):
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        author = AuthorStats.objects.select_related('author').order_by(
+            '-posts_count'
+        ).first().author
+        post = Post.objects.order_by('-comments_count').first()
+        reader = Follow.objects.order_by().values('user').annotate(
+            total=Count('id')
+        ).order_by('-total').first()['user']
+        client = Client()
+        reader_client = Client()
+        reader_client.force_login(User.objects.get(pk=reader))
+        requests = {
+            'index': lambda: client.get(reverse('posts:index')),
+            'group_posts': lambda: client.get(
+                reverse('posts:group_list', args=[group.slug])
+            ),
+            'profile': lambda: client.get(
+                reverse('posts:profile', args=[author.username])
+            ),
+            'post_detail': lambda: client.get(
+                reverse('posts:post_detail', args=[post.id])
+            ),
+            'follow_index': lambda: reader_client.get(
+                reverse('posts:follow_index')
+            ),
+            'post_create': lambda: reader_client.post(
+                reverse('posts:post_create'), {'text': 'Пост из замера'}
+            ),
+            'add_comment': lambda: reader_client.post(
+                reverse('posts:add_comment', args=[post.id]),
+                {'text': 'Комментарий из замера'},
+            ),
+        }
+        return {
+            view: measure(request, options['repeat'], not options['warm'])
+            for view, request in requests.items()
+        }
@@ -0,0 +1,38 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, TABLES, export_rows, write_table
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в каталог: '
+            'по файлу JSONL или CSV на таблицу. Картинки постов '
+            'выгружаются путями, сами файлы копируются вместе с MEDIA_ROOT')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=FORMATS, default='jsonl')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за один запрос',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        file_format = options['format']
+        os.makedirs(directory, exist_ok=True)
+        for table in TABLES:
+            start = time.perf_counter()
+            rows = export_rows(table).iterator(
+                chunk_size=options['chunk_size']
+            )
+            path = os.path.join(directory, f'{table}.{file_format}')
+            written = write_table(path, file_format, table, rows)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{table}: {written} строк за {elapsed:.1f} с '
+                f'({written / max(elapsed, 1e-6):.0f} строк/с)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {directory}'))
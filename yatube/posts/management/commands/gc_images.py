@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.blobs import collect_unreferenced, collect_untracked
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки, на которые не ссылается ни один пост, '
+            'вместе с их миниатюрами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.IMAGE_GC_GRACE,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что было бы удалено',
+        )
+
+    def handle(self, *args, **options):
+        grace, dry_run = options['grace'], options['dry_run']
+        removed = (collect_unreferenced(grace, dry_run)
+                   + collect_untracked(grace, dry_run))
+        for name in removed:
+            self.stdout.write(name)
+        verb = 'Будет удалено' if dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {len(removed)}'
+        ))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts.feeds import rebuild_timelines
+from posts.transfer import (
+    TABLES, import_table, read_table, reset_sequences, table_path,
+)
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_yatube пачками через bulk_create. '
+            'Недостающие пользователи создаются без пароля')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк вставлять одним запросом',
+        )
+        parser.add_argument(
+            '--no-timelines', action='store_true',
+            help='Не пересобирать ленты подписок после загрузки',
+        )
+
+    def progress(self, table, done, elapsed):
+        now = time.perf_counter()
+        # Не чаще раза в секунду, чтобы вывод не тормозил загрузку.
+        if now - self.reported < 1:
+            return
+        self.reported = now
+        self.stdout.write(
+            f'{table}: {done} строк, {done / max(elapsed, 1e-6):.0f} строк/с'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        found = {table: table_path(directory, table) for table in TABLES}
+        if not any(found.values()):
+            raise CommandError(f'В {directory} нет файлов выгрузки')
+        self.reported = time.perf_counter()
+        for table, located in found.items():
+            if located is None:
+                continue
+            start = time.perf_counter()
+            try:
+                done = import_table(
+                    table, read_table(*located), options['batch_size'],
+                    progress=self.progress,
+                )
+            except (IntegrityError, KeyError, ValueError) as error:
+                raise CommandError(f'{table}: {error}') from error
+            elapsed = time.perf_counter() - start
+            self.stdout.write(self.style.SUCCESS(
+                f'{table}: загружено {done} строк за {elapsed:.1f} с '
+                f'({done / max(elapsed, 1e-6):.0f} строк/с)'
+            ))
+        reset_sequences()
+        if not options['no_timelines'] and (found['posts']
+                                            or found['follows']):
+            self.stdout.write(
+                f'Ленты пересобраны, подписок: {rebuild_timelines()}'
+            )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import rebuild_timelines
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля'
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, подписок обработано: {rebuilt}'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comments_count, reconcile_posts_count
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с таблицами и чинит их'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк сверять за один проход',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts_fixed = reconcile_posts_count(batch_size)
+        comments_fixed = reconcile_comments_count(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков постов: {posts_fixed}, '
+            f'комментариев: {comments_fixed}'
+        ))
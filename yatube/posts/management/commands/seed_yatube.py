@@ -0,0 +1,140 @@
+import os
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import (
+    Seeder, bulk_load, fill_timelines, next_id, rows_inserter, write,
+)
+
+
+def start_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками со степенными '
+            'распределениями. Один seed - одни и те же данные')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=300_000)
+        parser.add_argument('--follows', type=int, default=200_000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--start', type=start_date, default=start_date('2021-01-01'),
+            help='Дата первого поста, ГГГГ-ММ-ДД',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='На сколько дней растянуть публикации',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=min(os.cpu_count() or 1, 4),
+            help='Сколько процессов строят строки, пока база пишет',
+        )
+        parser.add_argument(
+            '--no-timelines', action='store_true',
+            help='Не заполнять ленты подписок новых пользователей',
+        )
+
+    def table(self, label, batches, insert, limit=None):
+        reported = time.perf_counter()
+        started = reported
+
+        def progress(done, elapsed):
+            nonlocal reported
+            if time.perf_counter() - reported >= 1:
+                reported = time.perf_counter()
+                self.stdout.write(
+                    f'{label}: {done} строк, '
+                    f'{done / max(elapsed, 1e-6):.0f} строк/с'
+                )
+
+        done = write(batches, insert, limit, progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{label}: {done} строк за {elapsed:.1f} с '
+            f'({done / max(elapsed, 1e-6):.0f} строк/с)'
+        )
+        return done
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        seeder = Seeder(
+            options['seed'], options['start'], options['days'],
+            options['batch_size'],
+        )
+        workers = options['workers']
+        seeder.user_count = options['users']
+        seeder.group_count = options['groups']
+        seeder.post_count = options['posts']
+        seeder.comment_count = options['comments'] if options['posts'] else 0
+        seeder.follow_count = options['follows']
+        seeder.first_post = next_id(Post)
+        started = time.perf_counter()
+        with bulk_load():
+            self.table(
+                'users', map(seeder.user_rows,
+                             seeder.batches(seeder.user_count)),
+                User.objects.bulk_create,
+            )
+            seeder.user_ids = list(
+                User.objects.filter(username__startswith=f'{seeder.prefix}_')
+                .order_by('id').values_list('id', flat=True)
+            )
+            self.table(
+                'groups', map(seeder.group_rows,
+                              seeder.batches(seeder.group_count)),
+                Group.objects.bulk_create,
+            )
+            seeder.group_ids = list(
+                Group.objects.filter(slug__startswith=f'{seeder.prefix}-')
+                .order_by('id').values_list('id', flat=True)
+            )
+            self.table(
+                'posts', seeder.build(
+                    'post_rows', seeder.batches(seeder.post_count), workers
+                ),
+                rows_inserter(Post, (
+                    'id', 'text', 'pub_date', 'author', 'group', 'image',
+                    'comments_count',
+                )),
+            )
+            self.table(
+                'comments', seeder.build(
+                    'comment_rows', seeder.batches(seeder.comment_count),
+                    workers,
+                ),
+                rows_inserter(Comment, ('post', 'author', 'text', 'created')),
+            )
+            self.table(
+                'follows', seeder.build(
+                    'follow_rows', seeder.batches(seeder.user_count), workers
+                ),
+                rows_inserter(Follow, ('user', 'author'),
+                              ignore_conflicts=True),
+                limit=seeder.follow_count,
+            )
+            inserted = time.perf_counter()
+        self.stdout.write(
+            f'Индексы, поиск и счётчики: '
+            f'{time.perf_counter() - inserted:.1f} с'
+        )
+        if not options['no_timelines']:
+            started_timelines = time.perf_counter()
+            total = fill_timelines(seeder.user_ids)
+            self.stdout.write(
+                f'Ленты: {total} строк за '
+                f'{time.perf_counter() - started_timelines:.1f} с'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_pull_authors(apps, schema_editor):
+    # Посты авторов выше порога до сих пор не раскладывались по лентам.
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    author_ids = list(
+        Follow.objects.order_by().values_list('author_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=settings.FEED_FANOUT_THRESHOLD)
+        .values_list('author_id', flat=True)
+    )
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(author_id=author_id) for author_id in author_ids],
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.filter(author_id__in=author_ids).update(
+        feed_pull=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='feed_pull',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются при показе'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -40,13 +42,33 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.text[:15]}, {self.pub_date}, {self.group}'
@@ -74,6 +96,12 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -88,5 +116,99 @@ class Follow(models.Model):
         on_delete=models.CASCADE
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='follow_unique_user_author',
+            ),
+        ]
+
     def __str__(self):
         return f"Последователь: '{self.user}', автор: '{self.author}'"
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора, чтобы не считать COUNT(*)."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    # Часть постов автора не разложена по лентам: лента подписок
+    # дочитывает их при показе, пока feeds.settle_pull_author не
+    # разложит их и не снимет отметку.
+    feed_pull = models.BooleanField('Посты читаются при показе',
+                                    default=False)
+
+    def __str__(self):
+        return f"Автор '{self.author}': постов {self.posts_count}"
+
+
+class ImageBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Файлы с нулём ссылок удаляет команда gc_images.
+    """
+    name = models.CharField('Файл', max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
+    created = models.DateTimeField('Создан', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['refs', 'created'],
+                name='imageblob_refs_created_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}: ссылок {self.refs}"
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост).
+
+    Заполняется при публикации поста (fan-out on write), поэтому
+    страница ленты - это один проход по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='timeline_unique_user_post',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Лента '{self.user}': пост {self.post_id}"
@@ -0,0 +1,228 @@
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+
+from .models import Post
+from .utils import KeysetPaginator, decode_cursor
+
+FTS_TABLE = 'posts_post_fts'
+# Внешний контент: текст хранится только в posts_post, индекс - в FTS5.
+INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='3 4'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+TRIGGERS = {f'{FTS_TABLE}_insert', f'{FTS_TABLE}_delete',
+            f'{FTS_TABLE}_update'}
+# Больше слов в запросе не берём: каждое - отдельный проход по индексу.
+MAX_TERMS = 8
+# Короткий префикс раскрывается в тысячи слов, такие ищем целиком.
+# Префиксы из 3 и 4 букв берутся из отдельного индекса (prefix= выше).
+MIN_PREFIX = 3
+# bm25 считается для каждого совпадения, и частое слово даёт сотни
+# тысяч строк. Ранжируем только самые свежие RANK_WINDOW совпадений,
+# остальные идут после них от новых к старым.
+RANK_WINDOW = 1000
+# Ранг совпадений за окном; их курсор - (TAIL_RANK, -id), чтобы вся
+# выдача шла по возрастанию ключа.
+TAIL_RANK = float('inf')
+
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+
+def ensure_index(using_connection=None):
+    """Создаёт индекс и триггеры, если их нет; тогда же перестраивает.
+
+    SQLite пересоздаёт таблицу при многих ALTER в миграциях и теряет
+    её триггеры, поэтому проверка идёт после каждого migrate.
+    """
+    db = using_connection or connection
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if TRIGGERS <= existing:
+            return False
+        for statement in INDEX_SQL:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+        )
+    return True
+
+
+@contextmanager
+def index_suspended():
+    """Снимает триггеры индекса на время массовой вставки.
+
+    Построчное обновление FTS5 в разы медленнее самой вставки; после
+    блока ensure_index вернёт триггеры и перестроит индекс целиком.
+    """
+    if not is_supported():
+        yield
+        return
+    with connection.cursor() as cursor:
+        for name in sorted(TRIGGERS):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    try:
+        yield
+    finally:
+        ensure_index()
+
+
+def fts_query(text):
+    """Запрос FTS5 из пользовательской строки: все слова, по префиксу.
+
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 (NEAR, OR,
+    двоеточие, звёздочка) из ввода не ломали запрос.
+    """
+    words = re.findall(r'\w+', text.lower())[:MAX_TERMS]
+    return ' '.join(
+        f'"{word}"*' if len(word) >= MIN_PREFIX else f'"{word}"'
+        for word in words
+    ) or None
+
+
+def matching_ids(text):
+    """Подзапрос id постов, подходящих под строку: (sql, params)."""
+    return (
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [fts_query(text)],
+    )
+
+
+def window_floor():
+    """Наименьший rowid окна; параметры - запрос и RANK_WINDOW - 1."""
+    return (
+        f'coalesce((SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+        f'MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s), 0)'
+    )
+
+
+def ranked_sql(cursor=False, reverse=False):
+    """SQL страницы поиска: (rowid, score) по возрастанию bm25.
+
+    Параметры: запрос, запрос, RANK_WINDOW - 1, затем, если есть
+    курсор, score, score, rowid, и в конце LIMIT. Ограничение rowid
+    FTS5 проверяет по индексу, поэтому bm25 считается только в окне.
+    """
+    op, order = ('<', 'DESC') if reverse else ('>', 'ASC')
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid >= {window_floor()}'
+    )
+    if cursor:
+        sql += f' AND (score {op} %s OR (score = %s AND rowid {op} %s))'
+    return sql + f' ORDER BY score {order}, rowid {order} LIMIT %s'
+
+
+def tail_sql(cursor=False, reverse=False):
+    """SQL совпадений за окном ранжирования, от новых к старым.
+
+    Параметры: запрос, запрос, RANK_WINDOW - 1, затем rowid курсора,
+    если он есть, и LIMIT. Ранг не считается (NULL), порядок - по
+    индексу.
+    """
+    op, order = ('>', 'ASC') if reverse else ('<', 'DESC')
+    sql = (
+        f'SELECT rowid, NULL FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid < {window_floor()}'
+    )
+    if cursor:
+        sql += f' AND rowid {op} %s'
+    return sql + f' ORDER BY rowid {order} LIMIT %s'
+
+
+class SearchPaginator(KeysetPaginator):
+    """Результаты FTS5 по релевантности bm25; курсор - пара (ранг, id).
+
+    Меньший bm25 - лучше, поэтому порядок возрастающий. Ранжируются
+    только rank_window самых новых совпадений, за ними остальные
+    от новых к старым. Посты дочитываются одним запросом по id
+    найденной страницы.
+    """
+
+    rank_window = RANK_WINDOW
+
+    def __init__(self, query, per_page):
+        super().__init__(None, per_page)
+        self.query = fts_query(query)
+
+    def sort_key(self, post):
+        if post.search_rank == TAIL_RANK:
+            return TAIL_RANK, -post.id
+        return post.search_rank, post.id
+
+    def parse_cursor(self, token):
+        return decode_cursor(token, parse=float)
+
+    def _ranks(self, sql, extra, limit):
+        params = [self.query, self.query, self.rank_window - 1, *extra]
+        with connection.cursor() as db:
+            db.execute(sql, params + [limit])
+            return db.fetchall()
+
+    def fetch(self, cursor=None, reverse=False):
+        if self.query is None:
+            return []
+        limit = self.per_page + 1
+        in_tail = cursor is not None and cursor[0] == TAIL_RANK
+        if in_tail:
+            ranks = self._ranks(
+                tail_sql(True, reverse), [-cursor[1]], limit
+            )
+        else:
+            extra = [cursor[0], cursor[0], cursor[1]] if cursor else []
+            ranks = self._ranks(
+                ranked_sql(cursor is not None, reverse), extra, limit
+            )
+        if len(ranks) < limit and in_tail == reverse:
+            # Дошли до границы окна: вперёд - в хвост, назад - в окно.
+            sql = ranked_sql if reverse else tail_sql
+            ranks += self._ranks(
+                sql(False, reverse), [], limit - len(ranks)
+            )
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in ranks]
+        )
+        rows = []
+        for pk, score in ranks:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = TAIL_RANK if score is None else score
+                rows.append(post)
+        return rows
+
+
+def search_paginator(query, per_page):
+    if is_supported():
+        return SearchPaginator(query, per_page)
+    # Без FTS5 остаётся медленный LIKE, но в привычном порядке ленты.
+    return KeysetPaginator(
+        Post.objects.filter(text__icontains=query)
+        .select_related('author', 'group'),
+        per_page,
+    )
@@ -0,0 +1,393 @@
+"""Синтетические данные для проверки производительности на объёме.
+
+Всё распределено по степенному закону: немногие авторы пишут почти
+всё и собирают почти всех подписчиков, немногие посты собирают почти
+все комментарии. Тексты собираются из словаря Faker, сам Faker на
+каждую строку не вызывается - он слишком медленный для миллионов строк.
+
+Каждая пачка строк строится своим генератором случайных чисел от
+(seed, таблица, номер пачки), поэтому пачки можно строить в пуле
+процессов, а результат от числа процессов не зависит.
+"""
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.functional import cached_property
+from faker import Faker
+
+from . import caching, counters, feeds
+from .models import Comment, Follow, Group, Post, Timeline, User
+from .search import index_suspended
+from .transfer import reset_sequences
+
+# Показатель степенного закона: чем больше, тем сильнее перекос.
+AUTHOR_SKEW = 1.1
+GROUP_SKEW = 1.0
+POST_SKEW = 1.2
+WORD_SKEW = 1.0
+FOLLOWS_TAIL = 1.3
+POST_WORDS = (5, 120)
+COMMENT_WORDS = (2, 30)
+GROUP_SHARE = 0.7
+WORD_STREAM = 1_000_000
+# Мультипликативная перестановка рангов: горячие посты разбросаны по
+# всей ленте, а не собраны в её начале.
+PERMUTATION_PRIME = 2_147_483_647
+
+_seeder = None
+
+
+def zipf_cumulative(count, skew):
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def zipf(rng, cumulative):
+    """Индекс от 0 с весом 1 / (ранг ** skew)."""
+    return bisect_left(cumulative, rng.random() * cumulative[-1])
+
+
+def rows_inserter(model, fields, ignore_conflicts=False):
+    """Функция, которая пишет кортежи значений одним executemany.
+
+    bulk_create тратит на подготовку каждого значения больше времени,
+    чем база на саму вставку; здесь значения уже готовы для базы.
+    """
+    ops = connection.ops
+    quote = ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(name).column) for name in fields
+    )
+    sql = '{} {} ({}) VALUES ({}){}'.format(
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        quote(model._meta.db_table), columns,
+        ', '.join(['%s'] * len(fields)),
+        ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts),
+    )
+
+    def insert(rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+    return insert
+
+
+def _start_worker(seeder):
+    global _seeder
+    # Соединения родителя после fork не трогаем, см. thumbnails.
+    for db in connections.all():
+        db.connection = None
+    _seeder = seeder
+
+
+def _build(method, number):
+    return getattr(_seeder, method)(number)
+
+
+class Seeder:
+    """Строит пачки строк каждой таблицы по номеру пачки.
+
+    Перед постами нужно заполнить user_ids и group_ids, перед
+    комментариями и подписками - ещё first_post и post_count.
+    """
+
+    def __init__(self, seed, start, days, batch_size):
+        self.seed = seed
+        self.prefix = f's{seed}'
+        # Наивное время в UTC база принимает без пересчёта поясов на
+        # каждой строке, а это почти половина времени генерации.
+        self.start = timezone.make_naive(start, timezone.utc)
+        self.span = timedelta(days=days).total_seconds()
+        self.batch_size = batch_size
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        rng = self.rng('words', 0)
+        words = sorted(set(faker.words(5000)))
+        rng.shuffle(words)
+        # Тексты - случайные отрезки одного длинного потока слов: это в
+        # десятки раз быстрее, чем выбирать каждое слово заново.
+        self.stream = rng.choices(
+            words, cum_weights=zipf_cumulative(len(words), WORD_SKEW),
+            k=WORD_STREAM,
+        )
+        self.first_names = [faker.first_name() for _ in range(300)]
+        self.last_names = [faker.last_name() for _ in range(300)]
+        self.user_count = self.group_count = self.post_count = 0
+        self.comment_count = self.follow_count = 0
+        self.user_ids = []
+        self.group_ids = []
+        self.first_post = 1
+
+    def __getstate__(self):
+        # Таблицы весов воркер построит сам, а не получит через pickle.
+        state = dict(self.__dict__)
+        for name in ('authors', 'groups', 'popularity'):
+            state.pop(name, None)
+        return state
+
+    def rng(self, table, number):
+        return random.Random(f'{self.seed}:{table}:{number}')
+
+    @cached_property
+    def authors(self):
+        return zipf_cumulative(len(self.user_ids), AUTHOR_SKEW)
+
+    @cached_property
+    def groups(self):
+        return zipf_cumulative(len(self.group_ids), GROUP_SKEW)
+
+    @cached_property
+    def popularity(self):
+        return zipf_cumulative(self.post_count, POST_SKEW)
+
+    def batches(self, total):
+        return range(-(-total // self.batch_size))
+
+    def numbers(self, number, total):
+        first = number * self.batch_size
+        return range(first, min(first + self.batch_size, total))
+
+    def text(self, rng, low, high):
+        random = rng.random
+        length = low + int(random() * (high - low + 1))
+        offset = int(random() * (WORD_STREAM - length))
+        return ' '.join(self.stream[offset:offset + length]).capitalize() + '.'
+
+    def date(self, index, delay=0):
+        """Дата поста с номером index, сдвинутая на delay секунд."""
+        value = self.start + timedelta(
+            seconds=self.span * index / self.post_count + delay
+        )
+        return connection.ops.adapt_datetimefield_value(value)
+
+    def user_rows(self, number):
+        rng = self.rng('users', number)
+        # Хэш один на всех: make_password на строку съел бы всё время.
+        password = make_password(None)
+        return [
+            User(
+                username=f'{self.prefix}_user{index}',
+                first_name=rng.choice(self.first_names),
+                last_name=rng.choice(self.last_names),
+                password=password,
+            )
+            for index in self.numbers(number, self.user_count)
+        ]
+
+    def group_rows(self, number):
+        rng = self.rng('groups', number)
+        return [
+            Group(
+                title=self.text(rng, 1, 3)[:-1],
+                slug=f'{self.prefix}-group-{index}',
+                description=self.text(rng, 10, 40),
+            )
+            for index in self.numbers(number, self.group_count)
+        ]
+
+    def post_rows(self, number):
+        rng = self.rng('posts', number)
+        low, high = POST_WORDS
+        rows = []
+        for index in self.numbers(number, self.post_count):
+            group_id = None
+            if self.group_ids and rng.random() < GROUP_SHARE:
+                group_id = self.group_ids[zipf(rng, self.groups)]
+            # Длина поста тоже с тяжёлым хвостом: почти все короткие.
+            length = min(high, int(low * rng.paretovariate(1.2)))
+            rows.append((
+                self.first_post + index,
+                self.text(rng, low, length),
+                self.date(index),
+                self.user_ids[zipf(rng, self.authors)],
+                group_id,
+                '',
+                0,
+            ))
+        return rows
+
+    def comment_rows(self, number):
+        rng = self.rng('comments', number)
+        rows = []
+        for _ in self.numbers(number, self.comment_count):
+            rank = zipf(rng, self.popularity)
+            index = rank * PERMUTATION_PRIME % self.post_count
+            rows.append((
+                self.first_post + index,
+                rng.choice(self.user_ids),
+                self.text(rng, *COMMENT_WORDS),
+                self.date(index, rng.expovariate(1 / 3600)),
+            ))
+        return rows
+
+    def follow_rows(self, number):
+        """Подписки очередных batch_size читателей.
+
+        Число подписок читателя - с тяжёлым хвостом, а цель выбирается
+        по тому же закону, что и автор поста. Сумма выходит около
+        follow_count, лишнее отрезает write.
+        """
+        rng = self.rng('follows', number)
+        users = len(self.user_ids)
+        mean = self.follow_count / users
+        tail = (FOLLOWS_TAIL - 1) / FOLLOWS_TAIL
+        rows = []
+        for index in self.numbers(number, users):
+            user_id = self.user_ids[index]
+            wanted = round(mean * tail * rng.paretovariate(FOLLOWS_TAIL))
+            wanted = min(wanted, users - 1)
+            targets = set()
+            # Популярных авторов выпадает много раз: тянем с запасом.
+            for _ in range(wanted * 4):
+                if len(targets) >= wanted:
+                    break
+                target = zipf(rng, self.authors)
+                if target != index:
+                    targets.add(target)
+            # Порядок по рангу, а не по set: он не зависит от значений id.
+            rows.extend(
+                (user_id, self.user_ids[target]) for target in sorted(targets)
+            )
+        return rows
+
+    def build(self, method, batches, workers):
+        """Пачки строк по порядку; с workers > 1 их строит пул процессов.
+
+        Вперёд строится не больше двух пачек на воркер, так что память
+        не растёт, даже если база пишет медленнее, чем строятся строки.
+        """
+        if workers < 2:
+            for number in batches:
+                yield getattr(self, method)(number)
+            return
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=_start_worker,
+                initargs=(self,)) as pool:
+            pending = deque()
+            for number in batches:
+                pending.append(pool.submit(_build, method, number))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def write(batches, insert, limit=None, progress=None):
+    """Пишет пачки по одной транзакции; возвращает число строк.
+
+    limit обрезает поток, если генератор дал строк больше нужного.
+    """
+    done = 0
+    started = time.perf_counter()
+    for rows in batches:
+        if limit is not None:
+            if done >= limit:
+                break
+            rows = rows[:limit - done]
+        if not rows:
+            continue
+        with transaction.atomic():
+            insert(rows)
+        done += len(rows)
+        if progress is not None:
+            progress(done, time.perf_counter() - started)
+    return done
+
+
+@contextmanager
+def indexes_dropped(models):
+    """Снимает неуникальные индексы SQLite и строит их заново в конце.
+
+    Вставка в индекс со случайными ключами стоит дороже самой строки,
+    а построение индекса по готовой таблице идёт одной сортировкой.
+    Уникальные индексы остаются: на них держится ignore_conflicts.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' "
+            "AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%%' "
+            f"AND tbl_name IN ({', '.join(['%s'] * len(tables))})",
+            tables,
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+@contextmanager
+def bulk_load():
+    """Всё, что нужно вокруг массовой вставки мимо сигналов."""
+    with index_suspended(), indexes_dropped([Post, Comment, Follow]):
+        yield
+    reset_sequences()
+    counters.reconcile_posts_count(10000)
+    counters.reconcile_comments_count(10000)
+    # Новые пользователи и группы в кэше ещё не встречались, устарели
+    # только общие счётчик и страницы.
+    cache.delete(counters.COUNT_KEY.format('global'))
+    caching.bump(['global'])
+
+
+def fill_timelines(user_ids):
+    """Ленты новых читателей одним INSERT ... SELECT; возвращает число строк.
+
+    То же, что rebuild_timelines, но без запроса на каждую подписку:
+    на данных со степенным законом лент получается на порядки больше,
+    чем подписок. Авторы выше FEED_FANOUT_THRESHOLD пропускаются и
+    отмечаются как pull-авторы.
+    """
+    if not user_ids:
+        return 0
+    ops = connection.ops
+    timeline = ops.quote_name(Timeline._meta.db_table)
+    follow = ops.quote_name(Follow._meta.db_table)
+    post = ops.quote_name(Post._meta.db_table)
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} {timeline} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {follow} f JOIN {post} p ON p.author_id = f.author_id '
+        'WHERE f.user_id BETWEEN %s AND %s AND f.author_id NOT IN ('
+        f'SELECT author_id FROM {follow} GROUP BY author_id '
+        'HAVING COUNT(*) > %s)'
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with indexes_dropped([Timeline]), transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                min(user_ids), max(user_ids),
+                settings.FEED_FANOUT_THRESHOLD,
+            ])
+            total = cursor.rowcount
+    feeds.mark_pull_authors(
+        Follow.objects.order_by().values_list('author_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=settings.FEED_FANOUT_THRESHOLD)
+        .values_list('author_id', flat=True)
+    )
+    return total
+
+
+def next_id(model):
+    last = model.objects.order_by('-id').values_list('id', flat=True).first()
+    return (last or 0) + 1
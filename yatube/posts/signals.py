@@ -0,0 +1,161 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feeds
+from .models import Comment, Follow, Group, Post, User
+
+
+def page_scopes(post, old_group_id=None):
+    """Области кэша страниц, на которых виден пост."""
+    scopes = ['global', f'author:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    if old_group_id not in (None, post.group_id):
+        slug = Group.objects.filter(
+            id=old_group_id
+        ).values_list('slug', flat=True).first()
+        if slug is not None:
+            scopes.append(f'group:{slug}')
+    return scopes
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        feeds.fanout_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    if instance.pk is not None:
+        saved = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+        instance._saved_group_id, instance._saved_image = saved or (None, '')
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_counts(
+            counters.post_scopes(instance.group_id), 1
+        )
+        counters.change_posts_count(instance.author_id, 1)
+        return
+    old_group_id = getattr(instance, '_saved_group_id', None)
+    if old_group_id != instance.group_id:
+        if old_group_id is not None:
+            counters.change_counts([f'group:{old_group_id}'], -1)
+        if instance.group_id is not None:
+            counters.change_counts([f'group:{instance.group_id}'], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_counts(
+        counters.post_scopes(instance.group_id), -1
+    )
+    counters.change_posts_count(instance.author_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_saved_image(sender, instance, created, **kwargs):
+    old_image = '' if created else getattr(instance, '_saved_image', '')
+    new_image = instance.image.name or ''
+    if old_image == new_image:
+        return
+    if old_image:
+        counters.change_image_refs(old_image, -1)
+    if new_image:
+        counters.change_image_refs(new_image, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        counters.change_image_refs(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def bump_saved_post_pages(sender, instance, **kwargs):
+    caching.bump(page_scopes(
+        instance, getattr(instance, '_saved_group_id', None)
+    ))
+
+
+@receiver(post_delete, sender=Post)
+def bump_deleted_post_pages(sender, instance, **kwargs):
+    caching.bump(page_scopes(instance))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def bump_commented_post_pages(sender, instance, **kwargs):
+    post = Post.objects.select_related('author', 'group').filter(
+        id=instance.post_id
+    ).first()
+    if post is not None:
+        caching.bump(page_scopes(post))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._saved_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Group)
+def bump_group_pages(sender, instance, **kwargs):
+    # Название группы видно и на главной, в карточках постов.
+    slugs = {instance.slug, getattr(instance, '_saved_slug', None)}
+    caching.bump(['global'] + [f'group:{slug}' for slug in slugs if slug])
+
+
+def only_last_login(update_fields):
+    # Вход в систему сохраняет только last_login - на страницах его нет.
+    return update_fields is not None and set(update_fields) <= {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is not None and not only_last_login(update_fields):
+        instance._saved_username = User.objects.filter(
+            pk=instance.pk
+        ).values_list('username', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=User)
+def bump_author_pages(sender, instance, update_fields=None, **kwargs):
+    if only_last_login(update_fields):
+        return
+    usernames = {instance.username,
+                 getattr(instance, '_saved_username', None)}
+    caching.bump(
+        ['global'] + [f'author:{name}' for name in usernames if name]
+    )
+
+
+@receiver(post_save, sender=Follow)
+def backfill_follower_timeline(sender, instance, created, **kwargs):
+    if created:
+        feeds.change_followers_count(instance.author_id, 1)
+        feeds.backfill_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def purge_follower_timeline(sender, instance, **kwargs):
+    feeds.change_followers_count(instance.author_id, -1)
+    feeds.purge_timeline(instance.user_id, instance.author_id)
+    feeds.settle_pull_author(instance.author_id)
@@ -0,0 +1,72 @@
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+
+from django.core.files import File, locks
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под именем из хэша содержимого.
+
+    Одинаковые загрузки ложатся в один файл posts/ab/<sha256>.jpg,
+    поэтому у них общий оригинал и общий набор миниатюр. Файл
+    удаляется не здесь, а командой gc_images, когда на него
+    не осталось ссылок.
+    """
+
+    lock_name = '.blobs.lock'
+
+    @contextmanager
+    def lock(self):
+        """Замок на файлы хранилища, общий для загрузок и gc_images.
+
+        Под ним загрузка решает, переиспользовать ли файл, а сборщик -
+        удалять ли его; иначе файл мог пропасть у только что
+        сохранённого поста.
+        """
+        os.makedirs(self.location, exist_ok=True)
+        with open(self.path(self.lock_name), 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock_file)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        with self.lock():
+            if self.exists(name):
+                # Свежая отметка времени не даёт gc_images удалить файл,
+                # на который вот-вот сошлётся новый пост.
+                os.utime(self.path(name))
+                return name
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        # Пишем во временный файл рядом и атомарно переименовываем:
+        # две одинаковые загрузки одновременно дадут тот же результат.
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        with self.lock():
+            os.replace(self.path(partial), self.path(name))
+        if hasattr(content, 'temporary_file_path'):
+            # Временный файл загрузки уже переехал в хранилище.
+            content.close()
+        return name
@@ -0,0 +1,51 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_KEY = 'post_card:{}:{}'
+
+
+def card_version(post):
+    """Версия карточки: меняется при любой правке того, что в ней видно."""
+    group = post.group
+    state = '|'.join(str(value) for value in (
+        post.text,
+        post.image.name,
+        post.pub_date.isoformat(),
+        post.comments_count,
+        post.author.username,
+        post.author.get_full_name(),
+        group.slug if group else '',
+        group.title if group else '',
+    ))
+    return hashlib.md5(state.encode()).hexdigest()
+
+
+def card_key(post):
+    return CARD_KEY.format(post.id, card_version(post))
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов страницы: одним get_many, рендерим только промахи."""
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    missed = {key: post for key, post in zip(keys, posts)
+              if key not in cards}
+    with prefetch_thumbnails(post.image for post in missed.values()):
+        for key, post in missed.items():
+            missed[key] = render_to_string(CARD_TEMPLATE, {'post': post})
+    if missed:
+        cache.set_many(missed, settings.POSTS_CACHE_TIMEOUT)
+        cards.update(missed)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,61 @@
+import logging
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 992px) 100vw, 960px'
+
+
+def image_variants(image):
+    """Варианты картинки по форматам: {формат: [миниатюры по ширине]}.
+
+    Миниатюру, которую не удалось сделать (файла нет или он битый),
+    пропускаем, как это делал тег thumbnail: страница важнее картинки.
+    """
+    variants = {image_format: [] for image_format
+                in settings.POST_IMAGE_FORMATS}
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES:
+        try:
+            thumbnail = get_thumbnail(image, geometry, **options)
+            # Без исходника размеры пусты, и падает именно чтение width.
+            thumbnail.width
+        except Exception as error:
+            logger.warning('Нет миниатюры %s для %s: %r',
+                           geometry, image.name, error)
+            continue
+        variants[options['format']].append(thumbnail)
+    return variants
+
+
+def srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {thumbnail.width}w' for thumbnail in thumbnails
+    )
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def responsive_image(image, sizes=DEFAULT_SIZES, loading='lazy'):
+    """<picture> с вариантами картинки: WebP для тех, кто умеет, и JPEG."""
+    if not image:
+        return {}
+    variants = image_variants(image)
+    *modern, fallback = settings.POST_IMAGE_FORMATS
+    if not variants[fallback]:
+        return {}
+    largest = variants[fallback][-1]
+    return {
+        'sources': [
+            (f'image/{image_format.lower()}', srcset(variants[image_format]))
+            for image_format in modern if variants[image_format]
+        ],
+        'srcset': srcset(variants[fallback]),
+        'src': largest.url,
+        'width': largest.width,
+        'height': largest.height,
+        'sizes': sizes,
+        'loading': loading,
+    }
@@ -0,0 +1,11 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+
+def jpeg_upload(name, size=(40, 20), exif=None):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif or b'')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
@@ -0,0 +1,73 @@
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Сколько запросов к базе может сделать страница с пустым кэшем.
+# Два из них у авторизованного читателя - сессия и пользователь.
+# Меняя бюджет, объясните в ревью, откуда взялся новый запрос.
+QUERY_BUDGETS = {
+    'posts:index': 3,
+    'posts:group_list': 4,
+    'posts:profile': 4,
+    'posts:post_detail': 4,
+    'posts:post_comments': 2,
+    'posts:search': 4,
+    # Число постов, pull-авторы из подписок, лента и одним запросом
+    # посты всех pull-авторов.
+    'posts:follow_index': 5,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+}
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def query_shape(sql):
+    """SQL без литералов: одинаковый у запросов, отличающихся id."""
+    return LITERAL.sub('?', sql)
+
+
+def duplicates(queries):
+    """Запросы, повторённые с разными параметрами, - признак N+1."""
+    shapes = Counter(query_shape(query['sql']) for query in queries)
+    return [f'{total} x {shape}' for shape, total in shapes.most_common()
+            if total > 1]
+
+
+class QueryBudgetMixin:
+    """Проверяет число запросов страницы по бюджету из QUERY_BUDGETS."""
+
+    def capture(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        return context.captured_queries
+
+    def fail_with_queries(self, message, queries):
+        repeated = duplicates(queries) or ['повторов нет']
+        all_queries = [query['sql'] for query in queries]
+        self.fail(
+            f'{message}\nПовторяющиеся запросы:\n  '
+            + '\n  '.join(repeated)
+            + '\nВсе запросы:\n  ' + '\n  '.join(all_queries)
+        )
+
+    def assertWithinBudget(self, url_name, func, *args, **kwargs):
+        queries = self.capture(func, *args, **kwargs)
+        budget = QUERY_BUDGETS[url_name]
+        if len(queries) > budget:
+            self.fail_with_queries(
+                f'{url_name}: {len(queries)} запросов при бюджете {budget}',
+                queries,
+            )
+        return queries
+
+    def assertQueriesDoNotGrow(self, url_name, before, after):
+        """Число запросов не зависит от того, сколько всего на странице."""
+        if len(after) > len(before):
+            self.fail_with_queries(
+                f'{url_name}: запросов стало {len(after)} '
+                f'вместо {len(before)}, когда на странице стало больше '
+                'записей',
+                after,
+            )
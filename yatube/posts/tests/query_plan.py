@@ -0,0 +1,43 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def plan_problems(sql, params=None):
+    """Полные проходы по таблицам и временные сортировки в плане запроса."""
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[-1] for row in cursor.fetchall()]
+    problems = []
+    for detail in details:
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in tables:
+            problems.append(detail)
+        elif TEMP_SORT in detail:
+            problems.append(detail)
+    return problems
+
+
+class QueryPlanMixin:
+    """Проверяет планы всех SELECT-запросов, выполненных во время вызова."""
+
+    def assertQueryPlansUseIndexes(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        failures = []
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            problems = plan_problems(sql)
+            if problems:
+                failures.append(f'{sql}\n    ' + '\n    '.join(problems))
+        if failures:
+            self.fail('Запросы без подходящего индекса:\n'
+                      + '\n'.join(failures))
+        return result
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.counters import COUNT_KEY
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def create_posts(self, count):
+        Post.objects.bulk_create(
+            Post(author=self.admin, group=self.group, text=f'Пост {number}')
+            for number in range(count)
+        )
+
+    def changelist_queries(self):
+        cache.set(COUNT_KEY.format('global'), Post.objects.count())
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Авторы и группы строк приходят одним JOIN, без N+1."""
+        self.create_posts(2)
+        _, few = self.changelist_queries()
+        self.create_posts(20)
+        _, many = self.changelist_queries()
+        self.assertEqual(len(few), len(many))
+
+    def test_no_count_over_table(self):
+        """Число строк берётся из счётчика, COUNT(*) не выполняется."""
+        self.create_posts(3)
+        response, queries = self.changelist_queries()
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertIsNone(response.context['cl'].full_result_count)
+
+    def test_group_uses_autocomplete(self):
+        """Колонка группы не выводит в каждой строке все группы сайта."""
+        Group.objects.create(title='Другая группа', slug='other')
+        self.create_posts(2)
+        response, _ = self.changelist_queries()
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(
+            response,
+            f'<option value="{self.group.pk}" selected>{self.group}</option>',
+            count=2, html=True,
+        )
+        self.assertNotContains(response, 'Другая группа')
+
+    def test_filtered_count_stops_after_page_window(self):
+        """С фильтром строки считаются только до конца окна страниц."""
+        self.create_posts(510)
+        filters = {'pub_date__gte': '2000-01-01'}
+        for page, expected in (('0', 401), ('1', 501)):
+            with self.subTest(page=page):
+                response = self.client.get(self.url, {**filters, 'p': page})
+                cl = response.context['cl']
+                self.assertEqual(cl.result_count, expected)
+                self.assertTrue(cl.multi_page)
+                self.assertEqual(len(cl.result_list), cl.list_per_page)
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.management.commands.bench_views import (
+    compare, isolated_settings, measure, percentile,
+)
+from posts.models import Post
+
+User = get_user_model()
+
+
+def results(**metrics):
+    return {'scales': {'10000': {'index': metrics}}}
+
+
+class BenchViewsTests(TestCase):
+    def test_percentile(self):
+        """Перцентиль по ближайшему рангу берётся из самой выборки."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile([7], 0.99), 7)
+
+    def test_compare_threshold(self):
+        """Время сравнивается с порогом, число запросов - точно."""
+        baseline = results(p50_ms=100, queries=3, db_steps=10)
+        self.assertEqual(
+            compare(results(p50_ms=115, queries=3, db_steps=12),
+                    baseline, 0.2),
+            [],
+        )
+        self.assertEqual(
+            compare(results(p50_ms=130, queries=4, db_steps=10),
+                    baseline, 0.2),
+            ['10000 index p50_ms: 100 -> 130',
+             '10000 index queries: 3 -> 4'],
+        )
+
+    def test_compare_ignores_small_and_unknown(self):
+        """Рост на доли миллисекунды и новые страницы не регрессия."""
+        baseline = results(p95_ms=2)
+        current = {'scales': {
+            '10000': {'index': {'p95_ms': 4}, 'search': {'queries': 9}},
+            '1000000': {'index': {'queries': 1}},
+        }}
+        self.assertEqual(compare(current, baseline, 0.2, 5), [])
+
+    def test_measure(self):
+        """Замер считает запросы страницы и отказывает на ошибках."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+        client = Client()
+        metrics = measure(lambda: client.get(reverse('posts:index')), 3)
+        self.assertGreater(metrics['queries'], 0)
+        self.assertLessEqual(metrics['p50_ms'], metrics['max_ms'])
+        with self.assertRaises(CommandError):
+            measure(lambda: client.get('/missing-page/'), 1)
+
+    def test_isolated_cache(self):
+        """Холодный замер чистит свой кэш, а не кэш приложения."""
+        cache.set('live', 'значение')
+        with isolated_settings(100):
+            cache.set('bench', 'замер')
+            cache.clear()
+        self.assertEqual(cache.get('live'), 'значение')
+        self.assertIsNone(cache.get('bench'))
@@ -0,0 +1,22 @@
+import warnings
+
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.test import SimpleTestCase
+
+from posts import caching
+
+
+class GenerationTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_scope_with_any_characters(self):
+        """Кириллица, пробелы и длинные имена не ломают ключи поколений"""
+        scopes = ['group:группа с пробелом', 'author:' + 'я' * 300]
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            before = caching.generations(scopes)
+            caching.bump(scopes[:1])
+            after = caching.generations(scopes)
+        self.assertEqual(after, [before[0] + 1, before[1]])
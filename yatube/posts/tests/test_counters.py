@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Post, User
+
+
+class DenormalizedCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_denormalized_counters(self):
+        """Счётчики постов и комментариев меняются вместе с данными"""
+        Post.objects.filter(author=self.user).delete()
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Пост'})
+        post = Post.objects.get(author=self.user)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            data={'text': 'Комментарий'})
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Пост после правки'})
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.user).posts_count, 1)
+
+        post.comments.all().delete()
+        post.delete()
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.user).posts_count, 0)
+
+    def test_reconcile_counters_command(self):
+        """Команда reconcile_counters чинит разошедшиеся счётчики"""
+        post = Post.objects.create(text='Пост', author=self.user)
+        Comment.objects.create(post=post, author=self.user, text='Раз')
+        Post.objects.filter(id=post.id).update(comments_count=7)
+        AuthorStats.objects.filter(author=self.user).delete()
+
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).posts_count,
+            Post.objects.filter(author=self.user).count())
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 from http import HTTPStatus
@@ -5,10 +6,11 @@ from http import HTTPStatus
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Group, Post, Comment
+from posts.models import Comment, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -34,6 +36,8 @@ class TaskCreateFormTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Записи sorl живут в кэше и переживают откат транзакции теста.
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -70,7 +74,8 @@ class TaskCreateFormTests(TestCase):
         first_post = Post.objects.first()
         self.assertEqual(first_post.text, templates_form_names['text'])
         self.assertEqual(first_post.group.id, templates_form_names['group'])
-        self.assertEqual(first_post.image, f"posts/{name}")
+        digest = hashlib.sha256(small_gif).hexdigest()
+        self.assertEqual(first_post.image, f"posts/{digest[:2]}/{digest}.gif")
 
     def test_edit_post(self):
         post = Post.objects.create(
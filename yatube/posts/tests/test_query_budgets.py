@@ -0,0 +1,174 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.query_budget import (
+    QUERY_BUDGETS, QueryBudgetMixin, duplicates, query_shape,
+)
+
+User = get_user_model()
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание группы'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост про котов'
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def fill(self):
+        """Полные страницы: много постов, авторов, подписок и комментариев.
+
+        У каждого комментария свой автор, а у постов ленты - свои
+        авторы и группы, чтобы поштучная подгрузка связей была видна.
+        """
+        users = [User.objects.create_user(username=f'user{number}')
+                 for number in range(15)]
+        groups = [
+            Group.objects.create(title=f'Группа {number}',
+                                 slug=f'group-{number}')
+            for number in range(3)
+        ]
+        for number, user in enumerate(users):
+            Post.objects.create(
+                author=user, group=groups[number % len(groups)],
+                text=f'Пост про котов {number}',
+            )
+            Post.objects.create(
+                author=self.author, group=self.group,
+                text=f'Ещё пост про котов {number}',
+            )
+            Comment.objects.create(
+                post=self.post, author=user, text=f'Комментарий {number}'
+            )
+            Follow.objects.create(user=self.reader, author=user)
+
+    def pages(self):
+        post = {'post_id': self.post.id}
+        return {
+            'posts:index': (self.reader_client, reverse('posts:index')),
+            'posts:group_list': (
+                self.reader_client,
+                reverse('posts:group_list', kwargs={'slug': 'group'}),
+            ),
+            'posts:profile': (
+                self.reader_client,
+                reverse('posts:profile', kwargs={'username': 'author'}),
+            ),
+            'posts:post_detail': (
+                self.reader_client,
+                reverse('posts:post_detail', kwargs=post),
+            ),
+            'posts:post_comments': (
+                self.reader_client,
+                reverse('posts:post_comments', kwargs=post),
+            ),
+            'posts:search': (
+                self.reader_client, reverse('posts:search') + '?q=котов',
+            ),
+            'posts:follow_index': (
+                self.reader_client, reverse('posts:follow_index'),
+            ),
+            'posts:post_create': (
+                self.author_client, reverse('posts:post_create'),
+            ),
+            'posts:post_edit': (
+                self.author_client,
+                reverse('posts:post_edit', kwargs=post),
+            ),
+        }
+
+    def measure_pages(self):
+        queries = {}
+        for url_name, (client, address) in self.pages().items():
+            cache.clear()
+            queries[url_name] = self.capture(client.get, address)
+        return queries
+
+    def test_every_budget_has_a_page(self):
+        """Бюджет есть у каждой проверяемой страницы и наоборот."""
+        self.assertEqual(set(self.pages()), set(QUERY_BUDGETS))
+
+    def test_pages_within_budget(self):
+        """Страницы с пустым кэшем укладываются в бюджет запросов."""
+        self.fill()
+        for url_name, (client, address) in self.pages().items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                self.assertWithinBudget(url_name, client.get, address)
+
+    def test_queries_do_not_grow_with_content(self):
+        """Запросов не больше, когда на странице больше записей."""
+        before = self.measure_pages()
+        self.fill()
+        after = self.measure_pages()
+        for url_name in QUERY_BUDGETS:
+            with self.subTest(url_name=url_name):
+                self.assertQueriesDoNotGrow(
+                    url_name, before[url_name], after[url_name]
+                )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_follow_index_with_pull_authors(self):
+        """Лента подписок не дороже, когда pull-авторов больше."""
+        fan = User.objects.create_user(username='fan')
+
+        def follow_pull_authors(numbers):
+            for number in numbers:
+                star = User.objects.create_user(username=f'star{number}')
+                Post.objects.create(author=star, text=f'Пост {number}')
+                # Два подписчика при пороге 1 - посты читаются при показе.
+                Follow.objects.create(user=fan, author=star)
+                Follow.objects.create(user=self.reader, author=star)
+
+        client, address = self.pages()['posts:follow_index']
+        follow_pull_authors(range(1))
+        cache.clear()
+        before = self.assertWithinBudget(
+            'posts:follow_index', client.get, address
+        )
+        follow_pull_authors(range(1, 5))
+        cache.clear()
+        after = self.assertWithinBudget(
+            'posts:follow_index', client.get, address
+        )
+        self.assertQueriesDoNotGrow('posts:follow_index', before, after)
+
+    def test_failure_lists_duplicated_sql(self):
+        """Сообщение о превышении показывает повторяющиеся запросы."""
+        def n_plus_one():
+            for post in Post.objects.all():
+                post.author.username
+        self.fill()
+        with self.assertRaisesMessage(AssertionError, 'x SELECT'):
+            self.assertWithinBudget('posts:index', n_plus_one)
+
+    def test_query_shape(self):
+        """Запросы, которые отличаются только литералами, совпадают."""
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id = 12 AND name = 'o''k'"),
+            'SELECT * FROM t WHERE id = ? AND name = ?',
+        )
+        self.assertEqual(
+            duplicates([{'sql': 'SELECT 1'}, {'sql': 'SELECT 2'},
+                        {'sql': 'SELECT a'}]),
+            ['2 x SELECT ?'],
+        )
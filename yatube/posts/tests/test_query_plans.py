@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.query_plan import QueryPlanMixin
+
+User = get_user_model()
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test-slug',
+            description='Описание группы',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(25)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_views_use_indexes(self):
+        """Запросы страниц постов идут по индексам без временных сортировок"""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group.slug}) + '?page=2',
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author}) + '?page=2',
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+        ]
+        for address in addresses:
+            with self.subTest(address=address):
+                cache.clear()
+                self.assertQueryPlansUseIndexes(self.client.get, address)
+
+    def test_keyset_next_page_uses_indexes(self):
+        """Следующая страница по курсору тоже идёт по индексу"""
+        address = reverse('posts:profile', kwargs={'username': self.author})
+        page = self.client.get(address).context['page_obj']
+        self.assertQueryPlansUseIndexes(
+            self.client.get, address, {'after': page.next_cursor})
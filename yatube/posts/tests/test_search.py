@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.search import SearchPaginator, fts_query
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.best = Post.objects.create(
+            author=cls.user, text='Кошка кошка кошка и собака'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Про собаку, кошку и длинный забор ' * 5
+        )
+        cls.newest = Post.objects.create(
+            author=cls.user, text='Только собаки'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('posts:search'), {'q': query, **params})
+
+    def test_results_ranked_by_relevance(self):
+        """Поиск находит по префиксу слова, лучшие совпадения выше."""
+        response = self.search('кошк')
+        self.assertEqual(
+            list(response.context['page_obj']), [self.best, self.other]
+        )
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 из ввода не ломают запрос."""
+        self.assertEqual(fts_query('кошка OR "собака* NEAR'),
+                         '"кошка"* "or" "собака"* "near"*')
+        self.assertIsNone(fts_query('!!!'))
+        self.assertEqual(self.search('"(*').status_code, 200)
+
+    @override_settings(POSTS_LIMIT=1)
+    def test_keyset_pages(self):
+        """Следующая страница продолжает порядок по релевантности."""
+        first = self.search('кошк').context['page_obj']
+        self.assertEqual(list(first), [self.best])
+        self.assertTrue(first.has_next())
+        second = self.search('кошк', after=first.next_cursor)
+        page = second.context['page_obj']
+        self.assertEqual(list(page), [self.other])
+        self.assertFalse(page.has_next())
+        self.assertContains(
+            second, '?q=%D0%BA%D0%BE%D1%88%D0%BA&amp;before='
+        )
+
+    def test_matches_beyond_rank_window(self):
+        """За окном ранжирования выдача продолжается от новых к старым."""
+        paginator = SearchPaginator('собак', 1)
+        paginator.rank_window = 1
+        pages = [paginator.page_after()]
+        while pages[-1].has_next():
+            pages.append(paginator.page_after(
+                paginator.parse_cursor(pages[-1].next_cursor)
+            ))
+        self.assertEqual(
+            [page.object_list for page in pages],
+            [[self.newest], [self.other], [self.best]],
+        )
+        back = paginator.page_before(
+            paginator.parse_cursor(pages[-1].previous_cursor)
+        )
+        self.assertEqual(back.object_list, [self.other])
+        back = paginator.page_before(
+            paginator.parse_cursor(back.previous_cursor)
+        )
+        self.assertEqual(back.object_list, [self.newest])
+        self.assertFalse(back.has_previous())
+
+    def test_index_follows_updates_and_deletes(self):
+        """Триггеры держат индекс в согласии с таблицей постов."""
+        post = Post.objects.get(pk=self.best.pk)
+        post.text = 'Про попугая'
+        post.save()
+        self.assertEqual(
+            SearchPaginator('попуга', 10).page_after().object_list, [post]
+        )
+        self.assertNotIn(
+            post, SearchPaginator('кошка', 10).page_after().object_list
+        )
+        post.delete()
+        self.assertEqual(
+            SearchPaginator('попуга', 10).page_after().object_list, []
+        )
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через FTS5 и находит формы слова."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошк'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.best, self.other}
+        )
@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+
+from posts.models import AuthorStats, Comment, Follow, Group, Post, Timeline
+from posts.seeding import Seeder
+
+User = get_user_model()
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+
+class SeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, **options):
+        options = {
+            'users': 50, 'groups': 5, 'posts': 600, 'comments': 900,
+            'follows': 300, 'batch_size': 100, 'workers': 1, **options,
+        }
+        call_command('seed_yatube', stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('id').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+                'comments_count',
+            )),
+            list(Comment.objects.order_by('id').values_list(
+                'post__text', 'author__username', 'text', 'created',
+            )),
+            list(Follow.objects.order_by('id').values_list(
+                'user__username', 'author__username',
+            )),
+        )
+
+    def test_seed_fills_tables(self):
+        """Команда создаёт заданное число строк во всех таблицах."""
+        self.seed()
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 600)
+        self.assertEqual(Comment.objects.count(), 900)
+        self.assertTrue(0 < Follow.objects.count() <= 300)
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+
+    def test_same_seed_same_data(self):
+        """Повторный запуск с тем же seed на пустой базе повторяет данные."""
+        self.seed()
+        first = self.snapshot()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
+
+    def test_rows_do_not_depend_on_workers(self):
+        """Пачки, построенные пулом процессов, совпадают с обычными."""
+        seeder = Seeder(1, START, 30, 50)
+        seeder.user_ids = list(range(1, 21))
+        seeder.group_ids = [1, 2]
+        seeder.post_count = 200
+        batches = seeder.batches(seeder.post_count)
+        self.assertEqual(
+            list(seeder.build('post_rows', batches, 2)),
+            list(seeder.build('post_rows', batches, 1)),
+        )
+
+    def test_power_law(self):
+        """Немногие авторы пишут большую часть постов."""
+        self.seed()
+        counts = sorted(
+            Post.objects.order_by().values('author')
+            .annotate(total=Count('id')).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(sum(counts[:5]), 600 / 2)
+        commented = Counter(
+            Comment.objects.values_list('post', flat=True)
+        )
+        top = sum(total for _, total in commented.most_common(60))
+        self.assertGreater(top, 900 / 2)
+
+    def test_derived_data_consistent(self):
+        """Счётчики комментариев, статистика авторов и ленты сходятся."""
+        self.seed()
+        for post in Post.objects.annotate(real=Count('comments')):
+            self.assertEqual(post.comments_count, post.real)
+        for stats in AuthorStats.objects.all():
+            self.assertEqual(
+                stats.posts_count,
+                Post.objects.filter(author=stats.author_id).count(),
+            )
+        follow = Follow.objects.first()
+        self.assertEqual(
+            Timeline.objects.filter(
+                user=follow.user_id, author=follow.author_id
+            ).count(),
+            Post.objects.filter(author=follow.author_id).count(),
+        )
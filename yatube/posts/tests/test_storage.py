@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.blobs import collect_unreferenced
+from posts.models import ImageBlob, Post, User
+from posts.tests.images import jpeg_upload
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def reuse_file_under_lock(storage, name, locked):
+    """Загрузка, которая переиспользует файл, пока сборщик ждёт замка."""
+    with storage.lock():
+        locked.set()
+        time.sleep(0.2)
+        os.utime(storage.path(name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки хранятся одним файлом с двумя ссылками"""
+        first = Post.objects.create(
+            text='Мем', author=self.user, image=jpeg_upload('meme.jpg'))
+        second = Post.objects.create(
+            text='Репост', author=self.user, image=jpeg_upload('copy.jpg'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).refs, 2)
+
+    def test_gc_images_removes_orphans(self):
+        """gc_images удаляет заменённые и брошенные картинки"""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=jpeg_upload('old.jpg'))
+        old_path = post.image.path
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.id}),
+            data={'text': 'Пост',
+                  'image': jpeg_upload('new.jpg', (60, 30))})
+        post.refresh_from_db()
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name).refs, 1)
+
+        call_command('gc_images', grace=0, stdout=StringIO())
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+        new_path = post.image.path
+        post.delete()
+        call_command('gc_images', grace=0, stdout=StringIO())
+        self.assertFalse(os.path.exists(new_path))
+
+    def test_gc_images_waits_for_upload_lock(self):
+        """Файл, переиспользованный под замком, сборщик не удаляет"""
+        post = Post.objects.create(
+            text='Пост', author=self.user, image=jpeg_upload('gc.jpg'))
+        name, path = post.image.name, post.image.path
+        post.delete()
+        ImageBlob.objects.filter(name=name).update(
+            created=timezone.now() - timedelta(hours=1))
+        stale = time.time() - 3600
+        os.utime(path, (stale, stale))
+
+        context = multiprocessing.get_context('fork')
+        locked = context.Event()
+        upload = context.Process(
+            target=reuse_file_under_lock,
+            args=(post.image.storage, name, locked),
+        )
+        upload.start()
+        self.assertTrue(locked.wait(10))
+        removed = collect_unreferenced(grace=60)
+        upload.join()
+
+        self.assertEqual(removed, [])
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, User
+from posts.tests.images import jpeg_upload
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Записи sorl живут в кэше и переживают откат транзакции теста.
+        cache.clear()
+
+    def test_generate_thumbnails_command(self):
+        """Команда generate_thumbnails заранее режет миниатюры картинок"""
+        cache_root = os.path.join(TEMP_MEDIA_ROOT, 'cache')
+        shutil.rmtree(cache_root, ignore_errors=True)
+        Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=jpeg_upload('thumb.jpg'),
+        )
+
+        out = StringIO()
+        call_command('generate_thumbnails', workers=1, stdout=out)
+
+        self.assertIn('с ошибками: 0', out.getvalue())
+        thumbnails = [
+            name for _, _, names
+            in os.walk(cache_root)
+            for name in names
+        ]
+        self.assertEqual(len(thumbnails),
+                         len(settings.THUMBNAIL_GEOMETRIES))
+
+    def test_thumbnail_lookups_batched(self):
+        """Число запросов страницы не растёт с числом картинок на ней"""
+        def index_queries(images):
+            Post.objects.all().delete()
+            for number in range(images):
+                Post.objects.create(
+                    text=f'Пост {number}',
+                    author=self.user,
+                    image=jpeg_upload(f'batch{number}.jpg',
+                                      (40 + number, 20)),
+                )
+            call_command('generate_thumbnails', workers=1, stdout=StringIO())
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('posts:index'))
+            return len(queries)
+
+        self.assertEqual(index_queries(1), index_queries(3))
+
+    def test_responsive_image_variants(self):
+        """Карточка отдаёт WebP и JPEG нескольких ширин с ленивой загрузкой"""
+        Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=jpeg_upload('responsive.jpg'),
+        )
+        cache.clear()
+        content = self.client.get(reverse('posts:index')).content
+        content = content.decode()
+
+        self.assertIn('type="image/webp"', content)
+        self.assertIn('loading="lazy"', content)
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertIn(f'.webp {width}w', content)
+            self.assertIn(f'.jpg {width}w', content)
+
+    def test_missing_and_broken_files(self):
+        """Пропавший или битый файл не роняет страницы с постом"""
+        broken = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'broken.jpg')
+        os.makedirs(os.path.dirname(broken), exist_ok=True)
+        with open(broken, 'wb') as file:
+            file.write(b'\xff\xd8\xff\xe0 not a jpeg')
+        for name in ('posts/missing.jpg', 'posts/broken.jpg'):
+            with self.subTest(name=name):
+                post = Post.objects.create(
+                    text='Пост', author=self.user, image=name)
+                cache.clear()
+                # sorl сам пишет в лог, что не смог открыть исходник.
+                with self.assertLogs('sorl.thumbnail.base', 'WARNING'), \
+                        self.assertLogs('posts.templatetags.post_images',
+                                        'WARNING'):
+                    index = self.client.get(reverse('posts:index'))
+                    detail = self.client.get(reverse(
+                        'posts:post_detail', kwargs={'post_id': post.id}))
+                for response in (index, detail):
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotContains(response, '<picture>')
+                post.delete()
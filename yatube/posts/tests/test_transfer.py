@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.models import (
+    AuthorStats, Comment, Follow, Group, ImageBlob, Post, Timeline,
+)
+
+User = get_user_model()
+PUBLISHED = datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Про всё'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(
+            author=self.author, group=self.group,
+            text='Текст с "кавычками", запятой\nи переносом',
+            image='posts/ab/ab.jpg',
+        )
+        Post.objects.filter(pk=self.post.pk).update(pub_date=PUBLISHED)
+        Post.objects.create(author=self.reader, text='Без группы')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+
+    def snapshot(self):
+        return {
+            'posts': list(Post.objects.order_by('id').values_list(
+                'id', 'text', 'pub_date', 'author__username',
+                'group__slug', 'image', 'comments_count',
+            )),
+            'comments': list(Comment.objects.values_list(
+                'id', 'post_id', 'author__username', 'text', 'created',
+            )),
+            'follows': list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            'groups': list(Group.objects.values_list(
+                'slug', 'title', 'description'
+            )),
+        }
+
+    def wipe(self):
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        ImageBlob.objects.all().delete()
+        User.objects.all().delete()
+
+    def round_trip(self, file_format):
+        before = self.snapshot()
+        call_command('export_yatube', self.directory,
+                     format=file_format, stdout=StringIO())
+        self.wipe()
+        call_command('import_yatube', self.directory, batch_size=1,
+                     stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_round_trip_jsonl(self):
+        """JSONL переносит все таблицы вместе с датами и путями картинок."""
+        self.round_trip('jsonl')
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, 'posts.jsonl'))
+        )
+
+    def test_round_trip_csv(self):
+        """CSV выдерживает кавычки, запятые и переносы строк в тексте."""
+        self.round_trip('csv')
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, 'posts.csv'))
+        )
+
+    def test_import_restores_derived_data(self):
+        """После загрузки сходятся счётчики, ссылки на файлы и ленты."""
+        self.round_trip('jsonl')
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertEqual(AuthorStats.objects.get(author=author).posts_count, 1)
+        self.assertEqual(
+            ImageBlob.objects.get(name='posts/ab/ab.jpg').refs, 1
+        )
+        self.assertEqual(
+            list(Timeline.objects.filter(user=reader)
+                 .values_list('post_id', flat=True)),
+            [self.post.id],
+        )
+        self.assertFalse(author.has_usable_password())
+
+    def test_import_reports_progress(self):
+        """Загрузка пишет число строк и скорость по каждой таблице."""
+        call_command('export_yatube', self.directory, stdout=StringIO())
+        self.wipe()
+        out = StringIO()
+        call_command('import_yatube', self.directory, stdout=out)
+        self.assertIn('posts: загружено 2 строк', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+
+    def test_import_conflict_is_reported(self):
+        """Повторная загрузка тех же id - ошибка команды, а не трейсбек."""
+        call_command('export_yatube', self.directory, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('import_yatube', self.directory, stdout=StringIO())
@@ -0,0 +1,101 @@
+import random
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+from posts.tests.images import jpeg_upload
+from posts.uploads import ingest_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def noisy_jpeg(size=(64, 32)):
+    """JPEG из шума: у него длинный поток данных после заголовка."""
+    rng = random.Random(0)
+    image = Image.new('RGB', size)
+    image.putdata([
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(size[0] * size[1])
+    ])
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class IngestImageTests(TestCase):
+    def test_truncated_jpeg_rejected(self):
+        """Обрезанный JPEG с целым заголовком не принимается"""
+        body = noisy_jpeg()
+        upload = SimpleUploadedFile('cut.jpg', body[:len(body) // 2],
+                                    content_type='image/jpeg')
+        with self.assertRaisesMessage(ValidationError,
+                                      'Загрузите правильное изображение.'):
+            ingest_image(upload)
+
+    def test_small_jpeg_passes_through(self):
+        """Целая маленькая картинка без EXIF сохраняется как есть"""
+        body = noisy_jpeg()
+        upload = SimpleUploadedFile('whole.jpg', body,
+                                    content_type='application/octet-stream')
+        result = ingest_image(upload)
+        self.assertIs(result, upload)
+        self.assertEqual(result.content_type, 'image/jpeg')
+        self.assertEqual(result.read(), body)
+
+    def test_extension_follows_format(self):
+        """Расширение имени берётся из формата картинки"""
+        body = noisy_jpeg()
+        for name in ('photo.JPEG', 'photo.jpe', 'photo.png', 'photo'):
+            with self.subTest(name=name):
+                upload = SimpleUploadedFile(name, body)
+                self.assertEqual(ingest_image(upload).name, 'photo.jpg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=(100, 100))
+    def test_upload_downscaled_without_exif(self):
+        """Большая картинка уменьшается, а EXIF из неё выбрасывается"""
+        exif = Image.Exif()
+        exif[0x010f] = 'Камера'
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото',
+                  'image': jpeg_upload('photo.jpg', (400, 200), exif)})
+
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_upload_too_many_pixels_rejected(self):
+        """Картинку с огромным числом пикселей отклоняем по заголовку"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Бомба', 'image': jpeg_upload('bomb.jpg')})
+
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка слишком большая: 40×20 пикселей.')
+        self.assertFalse(Post.objects.filter(text='Бомба').exists())
@@ -1,13 +1,23 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.paginator import Page
+from django.db import connection
 from django import forms
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts import counters
 from posts.forms import PostForm
-from posts.models import Group, Post, Follow
+from posts.feeds import rebuild_timelines
+from posts.models import (
+    AuthorStats, Comment, Group, Post, Follow, Timeline,
+)
+from posts.templatetags.post_cards import card_key
 
 User = get_user_model()
 
@@ -51,6 +61,7 @@ class TaskPagesTests(TestCase):
                                      ]
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -203,17 +214,68 @@ class TaskPagesTests(TestCase):
         """Проверка кэша для index"""
         response = self.authorized_client.get(reverse('posts:index'))
         posts = response.content
+        Post.objects.filter(pk=self.post.pk).update(text='мимо сигналов')
+        response_old = self.authorized_client.get(reverse('posts:index'))
+        old_posts = response_old.content
+        self.assertEqual(old_posts, posts)
         Post.objects.create(
             text='test_new_post',
             author=self.user,
         )
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts = response_old.content
-        self.assertEqual(old_posts, posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts)
+        self.assertContains(response_new, 'test_new_post')
+
+    def test_cache_group_and_profile_invalidated(self):
+        """Новый пост сразу виден на закэшированных страницах"""
+        addresses = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for address in addresses:
+            self.authorized_client.get(address)
+        Post.objects.create(
+            text='пост после кэша', author=self.user, group=self.group)
+        for address in addresses:
+            with self.subTest(address=address):
+                response = self.authorized_client.get(address)
+                self.assertContains(response, 'пост после кэша')
+
+    def test_cache_invalidated_by_group_and_author_edit(self):
+        """Правка группы и имени автора сразу видна на их страницах"""
+        group_address = reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug})
+        profile_address = reverse(
+            'posts:profile', kwargs={'username': self.user})
+        self.authorized_client.get(group_address)
+        self.authorized_client.get(profile_address)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название группы'
+        group.save()
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Новое имя'
+        author.save()
+        self.assertContains(
+            self.authorized_client.get(group_address),
+            'Новое название группы')
+        self.assertContains(
+            self.authorized_client.get(profile_address), 'Новое имя')
+
+    def test_post_card_cache(self):
+        """Карточка поста кэшируется и обновляется после правки"""
+        address = reverse('posts:group_list',
+                          kwargs={'slug': self.group.slug})
+        self.authorized_client.get(address)
+        self.assertIsNotNone(cache.get(card_key(self.post)))
+
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Исправленный текст', 'group': self.group.id},
+        )
+        response = self.authorized_client.get(address)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertNotContains(response, self.post.text)
 
 
 class PaginatorViewsTest(TestCase):
@@ -240,6 +302,9 @@ class PaginatorViewsTest(TestCase):
         cls.authorised_client.force_login(cls.user)
         cls.guest_client = Client()
 
+    def setUp(self):
+        cache.clear()
+
     def test_first_page_contains_ten_records(self):
         addresses = [
             reverse('posts:index'),
@@ -262,6 +327,108 @@ class PaginatorViewsTest(TestCase):
             self.assertEqual(len(response.context['page_obj']),
                              self.CREATE_POST)
 
+    def test_keyset_pages(self):
+        """Курсорная пагинация проходит ленту вперёд и назад"""
+        address = reverse('posts:group_list',
+                          kwargs={'slug': self.group.slug})
+        first_page = self.guest_client.get(address).context['page_obj']
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+
+        second_page = self.guest_client.get(
+            address, {'after': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), self.CREATE_POST)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(set(first_page) & set(second_page))
+
+        back_page = self.guest_client.get(
+            address, {'before': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_counted_paginator(self):
+        """Пагинатор берёт число постов из счётчика и показывает окно"""
+        address = reverse('posts:profile', kwargs={'username': self.user})
+        response = self.guest_client.get(address, {'page': 1})
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, Post.objects.count())
+        self.assertEqual(list(page.page_window), [1, 2])
+
+        Post.objects.create(author=self.user, text='ещё пост')
+        Post.objects.filter(author=self.user).first().delete()
+        Post.objects.create(author=self.user, text='и ещё пост')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(address, {'page': 1})
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         Post.objects.count())
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'COUNT(' in query['sql']
+        ])
+
+    @override_settings(COUNTS_EXACT_TIMEOUT=0)
+    def test_exact_count_expires(self):
+        """Точный счётчик не живёт вечно и догоняет потерянные incr"""
+        scope = f'group:{self.group.id}'
+        posts = Post.objects.filter(group=self.group)
+        counters.count(scope, posts)
+        # bulk_create не шлёт сигналов - как incr, проигравший гонку.
+        Post.objects.bulk_create(
+            [Post(author=self.user, group=self.group, text='мимо')])
+        self.assertEqual(counters.count(scope, posts), posts.count())
+
+    def test_keyset_broken_cursor(self):
+        """Битый курсор открывает первую страницу"""
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': self.user}),
+            {'after': 'не-курсор'}
+        )
+        page = response.context['page_obj']
+        self.assertEqual(len(page), settings.POSTS_LIMIT)
+        self.assertFalse(page.has_previous())
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.COMMENTS_TOTAL = settings.COMMENTS_LIMIT + 5
+        for i in range(cls.COMMENTS_TOTAL):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{i}'),
+                text=f'Комментарий {i}',
+            )
+
+    def test_post_detail_first_comments_page(self):
+        """post_detail показывает только первую порцию комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_LIMIT)
+        self.assertTrue(comments.has_next())
+        self.assertEqual(comments[0].text,
+                         f'Комментарий {self.COMMENTS_TOTAL - 1}')
+
+    def test_load_more_comments(self):
+        """JSON-эндпоинт отдаёт следующую порцию без N+1"""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
+        cursor = response.context['comments'].next_cursor
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:post_comments',
+                        kwargs={'post_id': self.post.id}),
+                {'after': cursor})
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['html'].count('class="media mb-4"'), 5)
+        self.assertIn('reader0', data['html'])
+
+
 class FollowTest(TestCase):
     def setUp(self):
         self.client_auth_follower = Client()
@@ -300,4 +467,133 @@ class FollowTest(TestCase):
         self.assertEqual(post_text_0, self.post.text)
         response = self.client_auth_following.get(
             reverse('posts:follow_index'))
-        self.assertNotContains(response, self.post.text)
\ No newline at end of file
+        self.assertNotContains(response, self.post.text)
+
+    def test_new_post_pushed_to_feed(self):
+        """Новый пост автора попадает в ленту подписчика"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        new_post = Post.objects.create(
+            author=self.user_following, text='свежий пост')
+        self.assertTrue(Timeline.objects.filter(
+            user=self.user_follower, post=new_post).exists())
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    def test_unfollow_purges_feed(self):
+        """После отписки посты автора пропадают из ленты"""
+        self.client_auth_follower.get(reverse(
+            'posts:profile_follow', kwargs={
+                'username': self.user_following.username}))
+        self.client_auth_follower.get(reverse(
+            'posts:profile_unfollow', kwargs={
+                'username': self.user_following.username}))
+        self.assertFalse(
+            Timeline.objects.filter(user=self.user_follower).exists())
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(Timeline.objects.values_list('user', 'post')),
+            [(self.user_follower.id, self.post.id)])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_rebuild_timelines_settles_pull_authors(self):
+        """Пересборка стирает лишнее и раскладывает посты по порогу"""
+        cache.clear()
+        star = User.objects.create_user(username='Star')
+        for user in (self.user_follower, self.user_following):
+            Follow.objects.create(user=user, author=star)
+        Post.objects.create(author=star, text='звезда')
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        # Отметку оставил автор, который уже под порогом.
+        self.user_following.stats.feed_pull = True
+        self.user_following.stats.save()
+        Timeline.objects.filter(user=self.user_follower).delete()
+        Timeline.objects.create(
+            user=self.user_following, post=self.post,
+            author=self.user_following, pub_date=self.post.pub_date)
+
+        self.assertEqual(rebuild_timelines(), 3)
+        self.assertEqual(
+            list(Timeline.objects.values_list('user', 'post')),
+            [(self.user_follower.id, self.post.id)])
+        self.assertEqual(
+            set(AuthorStats.objects.filter(
+                feed_pull=True).values_list('author', flat=True)),
+            {star.id})
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_hybrid_feed_merges_pull_authors(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        cache.clear()
+        star = User.objects.create_user(username='Star')
+        for user in (self.user_follower, self.user_following):
+            Follow.objects.create(user=user, author=star)
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        star_posts = [
+            Post.objects.create(author=star, text=f'звезда {i}')
+            for i in range(settings.POSTS_LIMIT)
+        ]
+        pushed_post = Post.objects.create(
+            author=self.user_following, text='обычный автор')
+        self.assertFalse(Timeline.objects.filter(author=star).exists())
+
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        page = response.context['page_obj']
+        expected = [pushed_post] + star_posts[::-1]
+        self.assertEqual(list(page), expected[:settings.POSTS_LIMIT])
+        self.assertTrue(page.has_next())
+
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'), {'after': page.next_cursor})
+        self.assertEqual(
+            list(response.context['page_obj']),
+            expected[settings.POSTS_LIMIT:] + [self.post])
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_pull_author_below_threshold_keeps_posts(self):
+        """Автор ушёл под порог - его прежние посты остаются в ленте"""
+        cache.clear()
+        star = User.objects.create_user(username='Star')
+        for user in (self.user_follower, self.user_following):
+            Follow.objects.create(user=user, author=star)
+        pulled_post = Post.objects.create(author=star, text='звезда')
+        self.assertFalse(Timeline.objects.filter(author=star).exists())
+
+        Follow.objects.filter(user=self.user_following, author=star).delete()
+        self.assertTrue(Timeline.objects.filter(
+            user=self.user_follower, post=pulled_post).exists())
+        self.assertFalse(star.stats.feed_pull)
+        pushed_post = Post.objects.create(author=star, text='уже не звезда')
+        self.assertTrue(Timeline.objects.filter(
+            user=self.user_follower, post=pushed_post).exists())
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [pushed_post, pulled_post])
+
+    def test_numbered_feed_page_skips_keyset_paginator(self):
+        """По ?page=N подписки читаются один раз - для счётчика ленты"""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_auth_follower.get(
+                reverse('posts:follow_index'), {'page': 1})
+        page = response.context['page_obj']
+        self.assertEqual(list(page), [self.post])
+        self.assertEqual(page.paginator.count, 1)
+        follows = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_authorstats"' in query['sql']
+        ]
+        self.assertEqual(len(follows), 1)
+        self.assertNotIn('feed_pull', follows[0])
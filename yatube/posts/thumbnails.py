@@ -0,0 +1,105 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+
+from core import metrics
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _forget_connections():
+    # Соединения родителя после fork нельзя ни использовать, ни закрывать:
+    # воркер откроет свои при первом запросе.
+    for connection in connections.all():
+        connection.connection = None
+
+
+def executor():
+    """Общий для процесса пул, создаётся при первой загрузке картинки."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            initializer=_forget_connections,
+        )
+    return _executor
+
+
+def post_image(name):
+    """Файл картинки поста по имени - вместе с её хранилищем."""
+    return Post(image=name).image
+
+
+def render_thumbnails(name):
+    """Создаёт миниатюры всех размеров из THUMBNAIL_GEOMETRIES."""
+    image = post_image(name)
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES:
+        get_thumbnail(image, geometry, **options)
+    return name
+
+
+def _render_safely(name):
+    try:
+        render_thumbnails(name)
+    except Exception as error:
+        return name, repr(error)
+    return name, None
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось создать миниатюры: %r', error)
+
+
+def _job_finished(future):
+    metrics.inc('yatube_thumbnail_jobs_finished_total')
+
+
+def _submit(name):
+    global _executor
+    try:
+        future = executor().submit(render_thumbnails, name)
+    except RuntimeError:
+        # Пул сломан (упал воркер) - пересоздаём, иначе картинки
+        # так и будут резаться при первом показе.
+        _executor = None
+        future = executor().submit(render_thumbnails, name)
+    metrics.inc('yatube_thumbnail_jobs_submitted_total')
+    future.add_done_callback(_log_failure)
+    future.add_done_callback(_job_finished)
+
+
+def schedule_thumbnails(post):
+    """После коммита отдаёт нарезку миниатюр поста в пул процессов."""
+    if not post.image:
+        return
+    name = post.image.name
+    transaction.on_commit(lambda: _submit(name))
+
+
+def prefetch_thumbnails(images):
+    """Пачкой читает записи миниатюр, если KV-хранилище это умеет."""
+    kvstore = default.kvstore
+    if not hasattr(kvstore, 'prefetch'):
+        return nullcontext()
+    return kvstore.prefetch(list(images))
+
+
+def render_many(names, workers):
+    """Нарезает миниатюры для списка файлов, отдаёт пары (имя, ошибка)."""
+    if workers < 2:
+        yield from map(_render_safely, names)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_forget_connections
+    ) as pool:
+        yield from pool.map(_render_safely, names, chunksize=8)
@@ -0,0 +1,294 @@
+"""Потоковые выгрузка и загрузка групп, постов, комментариев и подписок.
+
+Каждая таблица - отдельный файл <имя>.jsonl или <имя>.csv в одном
+каталоге. Пользователи передаются по username, группы - по slug,
+поэтому выгрузку можно загрузить в базу с другими первичными ключами
+пользователей и групп; id постов и комментариев сохраняются.
+"""
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, feeds
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+# Порядок важен: загрузка идёт по нему, чтобы ссылки уже существовали.
+TABLES = ('groups', 'posts', 'comments', 'follows')
+FIELDS = {
+    'groups': ('slug', 'title', 'description'),
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'post', 'author', 'text', 'created'),
+    'follows': ('user', 'author'),
+}
+
+
+def export_rows(table):
+    """Строки таблицы для выгрузки: кортежи в порядке FIELDS[table].
+
+    Связи разворачиваются в username и slug тем же запросом, поэтому
+    на строку не приходится дополнительных запросов.
+    """
+    if table == 'groups':
+        return Group.objects.order_by('id').values_list(*FIELDS['groups'])
+    if table == 'posts':
+        return Post.objects.order_by('id').values_list(
+            'id', 'text', 'pub_date', 'author__username', 'group__slug',
+            'image',
+        )
+    if table == 'comments':
+        return Comment.objects.order_by('id').values_list(
+            'id', 'post_id', 'author__username', 'text', 'created',
+        )
+    return Follow.objects.order_by('id').values_list(
+        'user__username', 'author__username'
+    )
+
+
+def _plain(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_table(path, file_format, table, rows):
+    """Пишет строки в файл по одной; возвращает их число."""
+    fields = FIELDS[table]
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            writer = csv.writer(file)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow([_plain(value) for value in row])
+                written += 1
+            return written
+        for row in rows:
+            record = dict(zip(fields, (_plain(value) for value in row)))
+            file.write(json.dumps(record, ensure_ascii=False))
+            file.write('\n')
+            written += 1
+    return written
+
+
+def table_path(directory, table):
+    """Файл таблицы в каталоге выгрузки и его формат; None, если нет."""
+    for file_format in FORMATS:
+        path = os.path.join(directory, f'{table}.{file_format}')
+        if os.path.exists(path):
+            return path, file_format
+    return None
+
+
+def read_table(path, file_format):
+    """Словари строк файла, по одной за раз."""
+    with open(path, encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            # Текст поста может быть длиннее стандартного предела csv.
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _date(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'Не дата: {value!r}')
+    return parsed
+
+
+def user_ids(usernames):
+    """id пользователей по username; недостающие создаются без пароля."""
+    usernames = set(usernames)
+    ids = dict(
+        User.objects.filter(username__in=usernames)
+        .values_list('username', 'id')
+    )
+    missing = usernames - set(ids)
+    if missing:
+        User.objects.bulk_create(
+            [User(username=username, password=make_password(None))
+             for username in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'id')
+        )
+    return ids
+
+
+def group_ids(slugs):
+    slugs = {slug for slug in slugs if slug}
+    ids = dict(
+        Group.objects.filter(slug__in=slugs).values_list('slug', 'id')
+    )
+    missing = slugs - set(ids)
+    if missing:
+        raise ValueError(f'Нет групп: {", ".join(sorted(missing))}')
+    return ids
+
+
+@contextmanager
+def original_dates():
+    """Отключает auto_now_add, чтобы сохранить даты из выгрузки."""
+    fields = [Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def import_groups(rows):
+    slugs = {row['slug'] for row in rows}
+    existing = set(
+        Group.objects.filter(slug__in=slugs).values_list('slug', flat=True)
+    )
+    groups = [
+        Group(slug=row['slug'], title=row['title'],
+              description=row['description'])
+        for row in rows if row['slug'] not in existing
+    ]
+    Group.objects.bulk_create(groups, ignore_conflicts=True)
+    return len(groups)
+
+
+def import_posts(rows):
+    """Пишет пачку постов и сдвигает всё, что при save делают сигналы."""
+    authors = user_ids(row['author'] for row in rows)
+    groups = group_ids(row['group'] for row in rows)
+    posts = [
+        Post(
+            id=int(row['id']),
+            text=row['text'],
+            pub_date=_date(row['pub_date']),
+            author_id=authors[row['author']],
+            group_id=groups.get(row['group']),
+            image=row['image'] or '',
+        )
+        for row in rows
+    ]
+    Post.objects.bulk_create(posts)
+    scopes = Counter()
+    pages = {'global'}
+    for post, row in zip(posts, rows):
+        scopes.update(counters.post_scopes(post.group_id))
+        pages.add(f'author:{row["author"]}')
+        if row['group']:
+            pages.add(f'group:{row["group"]}')
+    for scope, total in scopes.items():
+        counters.change_counts([scope], total)
+    for author_id, total in Counter(p.author_id for p in posts).items():
+        counters.change_posts_count(author_id, total)
+    images = Counter(post.image.name for post in posts if post.image)
+    for name, total in images.items():
+        counters.change_image_refs(name, total)
+    caching.bump(pages)
+    return len(posts)
+
+
+def import_comments(rows):
+    authors = user_ids(row['author'] for row in rows)
+    comments = [
+        Comment(
+            id=int(row['id']),
+            post_id=int(row['post']),
+            author_id=authors[row['author']],
+            text=row['text'],
+            created=_date(row['created']),
+        )
+        for row in rows
+    ]
+    Comment.objects.bulk_create(comments)
+    per_post = Counter(comment.post_id for comment in comments)
+    for post_id, total in per_post.items():
+        counters.change_comments_count(post_id, total)
+    pages = {'global'}
+    for username, slug in Post.objects.filter(id__in=per_post).values_list(
+            'author__username', 'group__slug'):
+        pages.add(f'author:{username}')
+        if slug:
+            pages.add(f'group:{slug}')
+    caching.bump(pages)
+    return len(comments)
+
+
+def import_follows(rows):
+    users = user_ids(
+        name for row in rows for name in (row['user'], row['author'])
+    )
+    follows = [
+        Follow(user_id=users[row['user']], author_id=users[row['author']])
+        for row in rows
+    ]
+    Follow.objects.bulk_create(follows, ignore_conflicts=True)
+    # Сколько подписок уже было, неизвестно: счётчики посчитаются заново.
+    cache.delete_many({
+        feeds.FOLLOWERS_KEY.format(follow.author_id) for follow in follows
+    })
+    return len(follows)
+
+
+IMPORTERS = {
+    'groups': import_groups,
+    'posts': import_posts,
+    'comments': import_comments,
+    'follows': import_follows,
+}
+
+
+def import_table(table, rows, batch_size, progress=None):
+    """Загружает строки пачками по batch_size, каждую в своей транзакции.
+
+    В памяти одновременно только одна пачка. progress(table, done,
+    elapsed) вызывается после каждой пачки.
+    """
+    done = 0
+    start = time.perf_counter()
+    with original_dates():
+        for batch in _batches(rows, batch_size):
+            with transaction.atomic():
+                done += IMPORTERS[table](batch)
+            if progress is not None:
+                progress(table, done, time.perf_counter() - start)
+    return done
+
+
+def reset_sequences():
+    """Сдвигает последовательности id после вставки явных ключей."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [Group, Post, Comment, Follow]
+    )
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
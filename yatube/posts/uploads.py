@@ -0,0 +1,155 @@
+import os
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Форматы, которые принимаем, и параметры, с которыми их пережимаем.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+    'GIF': {},
+}
+# Расширение файла - по формату, а не по имени от клиента: иначе
+# одинаковые a.jpg и b.JPEG легли бы в хранилище двумя файлами.
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+    'GIF': '.gif',
+}
+
+
+def _source(upload):
+    # Pillow читает файл по частям: большой загрузке хватает пути к
+    # временному файлу, маленькую читаем прямо из памяти без копии.
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path()
+    upload.seek(0)
+    return upload
+
+
+def _open(upload):
+    """Разбирает только заголовок: пиксели пока не декодируются."""
+    try:
+        image = Image.open(_source(upload))
+    except Image.DecompressionBombError:
+        raise ValidationError(
+            'Картинка слишком большая.', code='image_too_large'
+        )
+    except Exception as error:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        ) from error
+    if image.format not in SAVE_OPTIONS:
+        image.close()
+        raise ValidationError(
+            'Поддерживаются только JPEG, PNG, GIF и WebP.',
+            code='invalid_image_format',
+        )
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        image.close()
+        raise ValidationError(
+            'Картинка слишком большая: %(width)s×%(height)s пикселей.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+    return image
+
+
+def _needs_rewrite(image):
+    max_width, max_height = settings.POST_IMAGE_MAX_SIZE
+    width, height = image.size
+    oversized = width > max_width or height > max_height
+    if image.format == 'GIF':
+        # Пережатие убило бы анимацию, а EXIF в GIF не бывает.
+        return oversized
+    return oversized or 'exif' in image.info
+
+
+def _decode(image):
+    """Декодирует пиксели: битый или обрезанный файл падает здесь.
+
+    Заголовок мог быть целым, а данные за ним - нет. JPEG декодируется
+    в масштабе 1/8: поток проверяется весь, а растр маленький.
+    """
+    width, height = image.size
+    image.draft(image.mode, (max(width // 8, 1), max(height // 8, 1)))
+    try:
+        image.load()
+    except (OSError, SyntaxError, ValueError) as error:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        ) from error
+
+
+def _rewrite(image, upload):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIZE и выбрасывает EXIF."""
+    image_format = image.format
+    max_size = settings.POST_IMAGE_MAX_SIZE
+    # JPEG умеет декодироваться сразу в уменьшенном масштабе -
+    # полноразмерный растр в памяти так и не появляется.
+    image.draft(image.mode, max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS)
+    result = TemporaryUploadedFile(
+        upload.name, Image.MIME[image_format], 0, None
+    )
+    options = dict(SAVE_OPTIONS[image_format])
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    image.save(result, image_format, **options)
+    result.size = result.tell()
+    result.seek(0)
+    return result
+
+
+def ingest_image(upload):
+    """Проверяет загрузку и приводит её к виду, в котором храним.
+
+    Размеры проверяются по заголовку до декодирования, поэтому
+    «бомба» отсеивается сразу. Память ограничена POST_IMAGE_MAX_PIXELS.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='file_too_large',
+            params={'limit': filesizeformat(
+                settings.POST_IMAGE_MAX_UPLOAD_SIZE
+            )},
+        )
+    image = _open(upload)
+    upload.name = (
+        os.path.splitext(upload.name)[0] + EXTENSIONS[image.format]
+    )
+    try:
+        if not _needs_rewrite(image):
+            image_format = image.format
+            _decode(image)
+            upload.content_type = Image.MIME[image_format]
+            upload.seek(0)
+            return upload
+        try:
+            return _rewrite(image, upload)
+        except (OSError, SyntaxError, ValueError) as error:
+            raise ValidationError(
+                'Загрузите правильное изображение.', code='invalid_image'
+            ) from error
+    finally:
+        # Файловый объект загрузки не закрываем: его ещё сохранит storage.
+        if hasattr(upload, 'temporary_file_path'):
+            image.close()
+
+
+class PostImageField(forms.ImageField):
+    """ImageField, который не декодирует загрузку целиком ради проверки."""
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        return ingest_image(upload)
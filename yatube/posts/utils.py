@@ -1,8 +1,266 @@
+import base64
+import binascii
+import heapq
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import counters
+from .models import Post
+
+
+def encode_cursor(values):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    raw = '|'.join(
+        value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        for value in values
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, parse=parse_datetime):
+    """Распаковывает токен курсора; для битого токена возвращает None.
+
+    parse разбирает первое значение ключа: по умолчанию это дата.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        key, pk = raw.decode().split('|')
+        key = parse(key)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if key is None:
+        return None
+    return key, pk
+
+
+class WindowedPage(Page):
+    """Страница, которая отдаёт шаблону только окно соседних номеров."""
+
+    @property
+    def page_window(self):
+        window = settings.POSTS_PAGE_WINDOW
+        first = max(self.number - window, 1)
+        last = min(self.number + window, self.paginator.num_pages)
+        return range(first, last + 1)
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт count из счётчиков, а не из COUNT(*).
+
+    Если число строк уже известно (posts_count автора), его можно
+    передать в total, и счётчик области не читается.
+    """
+
+    def __init__(self, object_list, per_page, scope, total=None):
+        super().__init__(object_list, per_page)
+        self.scope = scope
+        self.total = total
+
+    @cached_property
+    def count(self):
+        if self.total is not None:
+            return self.total
+        return counters.count(self.scope, self.object_list)
+
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+
+class EstimatedPaginator(Paginator):
+    """Paginator админки, который не считает строки целиком.
+
+    Без фильтров число постов берётся из счётчика 'global'. Для
+    фильтров и поиска строки считаются только до конца окна номеров
+    вокруг текущей страницы и ещё одной строки за ним: есть ли
+    страницы дальше, видно, а их точное число не нужно.
+    """
+
+    # Как ON_EACH_SIDE в шаблоне пагинации админки.
+    window = 3
+
+    def __init__(self, *args, number=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.number = number
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.model is Post and not queryset.query.where:
+            return counters.count('global', queryset)
+        limit = (self.number + self.window) * self.per_page
+        return queryset.order_by()[:limit + 1].count()
+
+
+class KeysetPage(Page):
+    """Страница курсорной пагинации с интерфейсом обычной Page."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if object_list:
+            self.next_cursor = paginator.cursor_for(object_list[-1])
+            self.previous_cursor = paginator.cursor_for(object_list[0])
 
+    def __repr__(self):
+        return f'<Keyset page after {self.previous_cursor}>'
 
-def pagination_fun(some_list, request):
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id): без COUNT(*) и без OFFSET.
+
+    Каждая страница - это один индексный проход от позиции курсора,
+    поэтому дальние страницы стоят столько же, сколько первая.
+    """
+
+    date_field = 'pub_date'
+    pk_field = 'id'
+
+    def __init__(self, object_list, per_page, date_field=None,
+                 pk_field=None, related=None):
+        super().__init__(object_list, per_page)
+        self.date_field = date_field or self.date_field
+        self.pk_field = pk_field or self.pk_field
+        self.related = related
+
+    def sort_key(self, row):
+        return getattr(row, self.date_field), getattr(row, self.pk_field)
+
+    def resolve(self, row):
+        """Объект для шаблона: сама строка или связанная с ней запись."""
+        if self.related:
+            return getattr(row, self.related)
+        return row
+
+    def cursor_for(self, obj):
+        return encode_cursor(self.sort_key(obj))
+
+    def parse_cursor(self, token):
+        return decode_cursor(token)
+
+    def _ordered(self, reverse=False):
+        prefix = '' if reverse else '-'
+        return self.object_list.order_by(
+            f'{prefix}{self.date_field}', f'{prefix}{self.pk_field}'
+        )
+
+    def _seek(self, queryset, cursor, reverse=False):
+        # pub_date <= X AND (pub_date < X OR id < Y): первое условие
+        # даёт диапазон по индексу, второе отсекает уже показанные строки.
+        pub_date, pk = cursor
+        op = 'gt' if reverse else 'lt'
+        return queryset.filter(**{
+            f'{self.date_field}__{op}e': pub_date,
+        }).filter(
+            Q(**{f'{self.date_field}__{op}': pub_date})
+            | Q(**{f'{self.pk_field}__{op}': pk})
+        )
+
+    def fetch(self, cursor=None, reverse=False):
+        """Возвращает до per_page + 1 строк после (или до) курсора."""
+        queryset = self._ordered(reverse)
+        if cursor is not None:
+            queryset = self._seek(queryset, cursor, reverse)
+        return [self.resolve(row) for row in queryset[:self.per_page + 1]]
+
+    def page_after(self, cursor=None):
+        rows = self.fetch(cursor)
+        return KeysetPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page,
+            has_previous=cursor is not None,
+        )
+
+    def page_before(self, cursor):
+        rows = self.fetch(cursor, reverse=True)
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return KeysetPage(
+            rows, self, has_next=True, has_previous=has_previous
+        )
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """Курсорная лента, слитая из нескольких упорядоченных потоков.
+
+    Из каждого потока читается не больше одной страницы, затем потоки
+    сливаются k-путевым слиянием по (pub_date, id) без дублей.
+    """
+
+    def __init__(self, streams, per_page):
+        super().__init__(None, per_page)
+        self.streams = streams
+
+    def fetch(self, cursor=None, reverse=False):
+        keyed = [
+            [(self.sort_key(row), row)
+             for row in stream.fetch(cursor, reverse)]
+            for stream in self.streams
+        ]
+        merged = heapq.merge(
+            *keyed, key=lambda item: item[0], reverse=not reverse
+        )
+        seen = set()
+        rows = []
+        for (_, pk), row in merged:
+            if pk in seen:
+                continue
+            seen.add(pk)
+            rows.append(row)
+            if len(rows) > self.per_page:
+                break
+        return rows
+
+
+def pagination_fun(some_list, request, keyset_paginator=None,
+                   scope='global', total=None):
+    """Страница по ?page=N или по курсору.
+
+    keyset_paginator - функция без аргументов, которая строит курсорный
+    пагинатор; зовётся, только если страница отдаётся по курсору.
+    total - известное заранее число строк для ?page=N.
+    """
     page_number = request.GET.get('page')
-    page_obj = Paginator(some_list, settings.POSTS_LIMIT).get_page(page_number)
-    return page_obj
+    if page_number is not None or settings.POSTS_PAGINATION != 'keyset':
+        # Старые ссылки вида ?page=N продолжают работать.
+        page_obj = CountedPaginator(
+            some_list, settings.POSTS_LIMIT, scope, total
+        ).get_page(page_number)
+        return page_obj
+    if keyset_paginator is not None:
+        paginator = keyset_paginator()
+    else:
+        paginator = KeysetPaginator(some_list, settings.POSTS_LIMIT)
+    return keyset_page(paginator, request)
+
+
+def keyset_page(paginator, request):
+    """Страница курсорного пагинатора по ?after= / ?before=."""
+    before = paginator.parse_cursor(request.GET.get('before'))
+    if before is not None:
+        page_obj = paginator.page_before(before)
+        if page_obj.has_previous():
+            return page_obj
+        # Дошли до начала ленты: отдаём полноценную первую страницу.
+        return paginator.page_after()
+    return paginator.page_after(
+        paginator.parse_cursor(request.GET.get('after'))
+    )
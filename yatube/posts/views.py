@@ -1,15 +1,23 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.template.loader import render_to_string
 
+from . import feeds
+from .caching import cache_page_by_generation
 from .forms import PostForm, CommentForm
 from .models import Follow, Group, Post, User
-from .utils import pagination_fun
-from django.http import HttpResponseRedirect
+from .search import search_paginator
+from .thumbnails import schedule_thumbnails
+from .utils import (
+    KeysetPaginator, decode_cursor, keyset_page, pagination_fun,
+)
 
 
-@cache_page(20)
+@cache_page_by_generation(lambda: ['global'])
 def index(request):
     post_list = Post.objects.select_related('group', 'author')
 
@@ -20,11 +28,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_by_generation(lambda slug: [f'group:{slug}'])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     post_list = group.posts.select_related('group', 'author')
 
-    page_obj = pagination_fun(post_list, request)
+    page_obj = pagination_fun(post_list, request, scope=f'group:{group.id}')
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -33,11 +42,18 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_by_generation(lambda username: [f'author:{username}'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     post_list = author.posts.select_related('group', 'author')
-
-    page_obj = pagination_fun(post_list, request)
+    # У автора без постов строки AuthorStats может не быть.
+    stats = getattr(author, 'stats', None)
+    page_obj = pagination_fun(
+        post_list, request,
+        total=stats.posts_count if stats is not None else 0,
+    )
     context = {
         'author': author,
         'page_obj': page_obj,
@@ -46,20 +62,36 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = keyset_page(
+            search_paginator(query, settings.POSTS_LIMIT), request
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_prefix': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def comments_page(post, cursor_token):
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_LIMIT,
+        date_field='created',
+    )
+    return paginator.page_after(decode_cursor(cursor_token))
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    # comments = post.comments.filter(active=True)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    comments = comments_page(post, request.GET.get('comments_after'))
     form = CommentForm()
-
-    # if request.method == 'POST':
-    #     comment_form = CommentForm(data=request.POST)
-    #     if comment_form.is_valid():
-    #         new_comment = comment_form.save(commit=False)
-    #         new_comment.post = post
-    #         new_comment.save()
-    # else:
-    #     comment_form = CommentForm()
     return render(request,
                   'posts/post_detail.html',
                   {
@@ -69,6 +101,20 @@ def post_detail(request, post_id):
                   })
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = comments_page(post, request.GET.get('after'))
+    html = ''.join(
+        render_to_string('posts/includes/comment.html', {'comment': comment})
+        for comment in comments
+    )
+    return JsonResponse({
+        'html': html,
+        'next': comments.next_cursor if comments.has_next() else None,
+    })
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -77,6 +123,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnails(post)
         return redirect('posts:profile', post.author)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -84,14 +131,18 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if request.user != post.author:
+    if request.user.id != post.author_id:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
         instance=post)
     if form.is_valid():
-        form.save()
+        # Пишем только поля формы, чтобы не затереть comments_count,
+        # который мог измениться, пока пост редактировали.
+        form.save(commit=False).save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post_id=post.id)
     context = {
         'form': form,
@@ -115,36 +166,29 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    posts_list = Post.objects.filter(author__id__in=authors)
-
-    paginator = Paginator(posts_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-
-    return render(
-        request,
-        'posts/follow.html',
-        {'page': page, 'paginator': paginator}
+    post_list = Post.objects.filter(
+        author__following__user=request.user
+    ).select_related('group', 'author')
+    page_obj = pagination_fun(
+        post_list, request, lambda: feeds.feed_paginator(request.user),
+        scope=f'feed:{request.user.id}',
     )
+    return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
 @login_required
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     user = request.user
     if author != user:
         Follow.objects.get_or_create(user=user, author=author)
-        return redirect(
-            'profile',
-            username=username
-        )
-    return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+    return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     user = request.user
-    Follow.objects.get(user=user, author__username=username).delete()
-    return HttpResponseRedirect(request.META.get('HTTP_REFERER'))
+    Follow.objects.filter(user=user, author__username=username).delete()
+    return redirect('posts:profile', username=username)
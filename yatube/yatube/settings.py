@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -125,6 +127,7 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -136,11 +139,107 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_LIMIT = 10
+COMMENTS_LIMIT = 20
+# 'keyset' - курсорная пагинация (?after=/?before=), 'offset' - ?page=N
+POSTS_PAGINATION = 'keyset'
+# сколько соседних номеров страниц показывать в пагинаторе
+POSTS_PAGE_WINDOW = 2
+# холодный счётчик считается точно, пока строк не больше этого числа,
+# дальше используется оценка, которая живёт COUNTS_ESTIMATE_TIMEOUT секунд
+COUNTS_EXACT_LIMIT = 100000
+COUNTS_ESTIMATE_TIMEOUT = 10 * 60
+# точный счётчик тоже пересчитывается: incr, пришедший между COUNT(*)
+# и записью в кэш, теряется, а у LocMemCache счётчик свой у каждого воркера
+COUNTS_EXACT_TIMEOUT = 10 * 60
+# кэш страниц сбрасывается сдвигом поколения, поэтому TTL большой
+POSTS_CACHE_TIMEOUT = 60 * 60
+# размер пачки при раскладке постов по лентам подписчиков
+FEED_BATCH_SIZE = 1000
+# авторов с большим числом подписчиков не раскладываем по лентам,
+# их посты подмешиваются в ленту при чтении
+FEED_FANOUT_THRESHOLD = 10000
+# загрузки картинок: предел размера файла, число пикселей по заголовку
+# (столько декодируем в худшем случае) и размер, до которого уменьшаем
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 16 * 1000 * 1000
+POST_IMAGE_MAX_SIZE = (2048, 2048)
+# gc_images не удаляет файлы моложе этого: загрузка могла ещё не
+# дойти до сохранения поста
+IMAGE_GC_GRACE = 24 * 60 * 60
+# варианты картинки поста для srcset: ширины, пропорции и форматы;
+# браузер сам выбирает самый лёгкий подходящий под экран
+POST_IMAGE_WIDTHS = [320, 640, 960]
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_FORMATS = ['WEBP', 'JPEG']
+# размеры миниатюр, которые режутся заранее; должны совпадать с тем,
+# что запрашивают шаблоны, иначе первый показ всё равно будет резать
+THUMBNAIL_GEOMETRIES = [
+    (f'{width}x{round(width * POST_IMAGE_RATIO[1] / POST_IMAGE_RATIO[0])}',
+     {'crop': 'center', 'upscale': True, 'format': image_format})
+    for width in POST_IMAGE_WIDTHS
+    for image_format in POST_IMAGE_FORMATS
+]
+# записи миниатюр страницы читаются из кэша одним get_many
+THUMBNAIL_KVSTORE = 'posts.kvstore.PrefetchingKVStore'
+# процессы, которые режут миниатюры после публикации поста
+THUMBNAIL_WORKERS = 2
+
+# доля запросов, которые профилируются, по имени URL ('*' - для
+# остальных), например {'posts:profile': 0.1, '*': 0.01}; итог уходит
+# в заголовок Server-Timing и в лог core.profiling (в консоль - только
+# без DEBUG, см. LOGGING)
+PROFILING_SAMPLE_RATES = {}
+# файл SQLite, в котором воркеры складывают метрики для /metrics;
+# None - метрики не собираются
+METRICS_DB = None
+# как часто воркер сливает накопленные метрики в METRICS_DB, секунды
+METRICS_FLUSH_INTERVAL = 1
+# токен, с которым Prometheus читает /metrics (Authorization: Bearer);
+# None - /metrics отвечает 404
+METRICS_TOKEN = None
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'null': {'class': 'logging.NullHandler'},
+    },
+    'loggers': {
+        # строки профиля никуда не пишутся, пока не включены явно, -
+        # иначе они засыпают вывод тестов и замеров
+        'core.profiling': {
+            'handlers': ['null'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# кто отдаёт тело медиафайла: None - сам Django (FileResponse),
+# 'x-accel-redirect' - nginx, 'x-sendfile' - Apache/lighttpd
+MEDIA_ACCEL = None
+# internal-location nginx, в которую смотрит X-Accel-Redirect
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+if not DEBUG:
+    # Имена с хэшем и заранее сжатые .gz/.br; отдаёт их обёртка в wsgi.py
+    STATICFILES_STORAGE = (
+        'core.staticfiles.storage.CompressedManifestStaticFilesStorage'
+    )
+    # Общий для всех WSGI-воркеров кэш без отдельного сервера
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.sqlite.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    }
+    METRICS_DB = os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+    METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN')
+    LOGGING['loggers']['core.profiling']['handlers'] = ['console']
@@ -1,19 +1,19 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.media import serve_media
+from core.metrics import metrics_view
+
 handler404 = 'core.views.page_not_found'
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('auth/', include('users.urls', namespace="users")),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace="posts")),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media,
+         name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )